@@ -1,75 +1,12 @@
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-import pandas as pd
-import numpy as np
-from sklearn.metrics import accuracy_score
-from sklearn.svm import SVC
-from sklearn.preprocessing import StandardScaler
-import pickle
+from training import train_disease
 
 print('Parkinson\'s Dataset')
 
-data = pd.read_csv('Datasets/Parkinsson disease.csv')
-
-data = data.drop(['name'], axis=1)
-
-print(data.isnull().sum())
-data = data.fillna(data.median())
-
-X = data.drop('status', axis=1)
-y = data['status']
-
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
-
-X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+#Model Training
 
 print('Random Forest Classifier\n')
 
-rf_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-rf_classifier.fit(X_train, y_train)
-y_pred = rf_classifier.predict(X_test)
-
-# Calculate and display the accuracy
-accuracy = accuracy_score(y_test, y_pred)
-print(f"Random Forest Accuracy: {accuracy:.2f}")
-
-'''
-print('Logistic Regression\n')
-
-log_reg = LogisticRegression(max_iter=1000)
-log_reg.fit(X_train, y_train)
-y_pred_log_reg = log_reg.predict(X_test)
-accuracy_log_reg = accuracy_score(y_test, y_pred_log_reg)
-print(f"Logistic Regression Accuracy: {accuracy_log_reg:.2f}")
-
-print('SVC\n')
-
-svc = SVC()
-svc.fit(X_train, y_train)
-
-y_pred_svc = svc.predict(X_test)
-accuracy_svc = accuracy_score(y_test, y_pred_svc)
-print(f"SVC Accuracy: {accuracy_svc:.2f}")
-
-print('Decision Tree Classifier\n')
-
-decision_tree = DecisionTreeClassifier(random_state=42)
-decision_tree.fit(X_train, y_train)
-y_pred_decision_tree = decision_tree.predict(X_test)
-accuracy_decision_tree = accuracy_score(y_test, y_pred_decision_tree)
-print(f"Decision Tree Accuracy: {accuracy_decision_tree:.2f}")
-
-print('Gradient Boosting Classifier\n')
-
-gradient_boosting = GradientBoostingClassifier(random_state=42)
-gradient_boosting.fit(X_train, y_train)
-y_pred_gradient_boosting = gradient_boosting.predict(X_test)
-accuracy_gradient_boosting = accuracy_score(y_test, y_pred_gradient_boosting)
-print(f"Gradient Boosting Accuracy: {accuracy_gradient_boosting:.2f}")
-'''
-
-#with open('rf_model_updated.sav','wb') as file:
-    #pickle.dump(rf_classifier, file)
\ No newline at end of file
+artifact = train_disease('parkinsons', method='grid', n_jobs=-1, verbose=1)
+metadata = artifact['metadata']
+print(f"Best parameters: {metadata['best_params']}")
+print(f"Random Forest Accuracy: {metadata['accuracy']:.2f}")
@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import math
+from typing import Dict, List, Literal, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field, create_model
+from starlette.concurrency import run_in_threadpool
+import metrics
+from create_db import DISEASE_FEATURES
+from micro_batching import batcher_stats, get_batching_generator, get_model_batcher
+from model_registry import get_registry
+from scoring import score_batch
+
+# Headless inference API next to the Streamlit UI: `uvicorn api:app` or `python api.py`.
+# Model and GPT-2 calls are CPU-bound, so they run in the threadpool and keep the event loop free.
+# Single predictions and suggestions go through the micro-batchers, so concurrent requests share one call.
+
+# One request model per disease, fields in the order the model was trained on; GET /schema serves them.
+# NaN and inf are rejected with a 422 here instead of failing inside the model.
+FEATURE_MODELS = {
+    disease: create_model(f"{''.join(part.title() for part in disease.split('_'))}Features",
+                          **{name: (float, Field(..., allow_inf_nan=False)) for name in features})
+    for disease, (_, features) in DISEASE_FEATURES.items()
+}
+
+
+class ScoreResponse(BaseModel):
+    disease: str
+    model_version: str
+    prediction: int
+    risk_score: float
+    risk_category: str
+    verdict: str
+
+
+class CombinedRequest(BaseModel):
+    diabetes: Optional[FEATURE_MODELS['diabetes']] = None
+    heart_disease: Optional[FEATURE_MODELS['heart_disease']] = None
+    parkinsons: Optional[FEATURE_MODELS['parkinsons']] = None
+
+
+# Only the 18 real (disease, prediction, risk) combinations get through to the prompt and the suggestion cache
+class SuggestionRequest(BaseModel):
+    disease: Literal[tuple(DISEASE_FEATURES)]
+    prediction: Literal[0, 1]
+    risk_category: Literal['Low Risk', 'Medium Risk', 'High Risk']
+
+
+class SuggestionResponse(BaseModel):
+    disease: str
+    suggestion: str
+
+
+app = FastAPI(title='HealthPredictX API')
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request, exc):
+    # Same 422 body as FastAPI's default handler, but a rejected NaN/inf input is echoed back as a
+    # string: JSON can't encode it, and the default handler would turn the 422 into a 500
+    errors = [{**error, 'input': repr(error['input'])}
+              if isinstance(error.get('input'), float) and not math.isfinite(error['input']) else error
+              for error in exc.errors()]
+    return JSONResponse(status_code=422, content={'detail': jsonable_encoder(errors)})
+
+
+def _vector(disease, features):
+    return [getattr(features, name) for name in DISEASE_FEATURES[disease][1]]
+
+
+def score_vectors(disease, rows):
+    entry = get_registry().get_entry(disease)
+    return [ScoreResponse(disease=disease, model_version=entry.version, **score._asdict())
+            for score in score_batch(entry.model, rows, disease)] if rows else []
+
+
+async def score_vector(disease, vector):
+    model_version, score = await asyncio.wrap_future(get_model_batcher(disease).submit(vector))
+    return ScoreResponse(disease=disease, model_version=model_version, **score._asdict())
+
+
+# a plain def runs in the threadpool: the first call loads the models, and a hot reload shouldn't block the event loop
+@app.get('/health')
+def health():
+    return {'status': 'ok', 'models': {disease: get_registry().version(disease) for disease in DISEASE_FEATURES}}
+
+
+@app.get('/stats')
+async def stats():
+    # queue depth, batch sizes and queue wait per micro-batcher
+    return batcher_stats()
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # latency histograms in the Prometheus text format; empty unless HPX_METRICS=1
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+@app.get('/schema')
+async def schema():
+    return {disease: {'table': table, 'feature_order': features, 'json_schema': FEATURE_MODELS[disease].model_json_schema()}
+            for disease, (table, features) in DISEASE_FEATURES.items()}
+
+
+@app.post('/predict', response_model=Dict[str, ScoreResponse])
+async def predict_combined(request: CombinedRequest):
+    vectors = {disease: _vector(disease, features) for disease in DISEASE_FEATURES
+               if (features := getattr(request, disease)) is not None}
+    if not vectors:
+        raise HTTPException(422, 'no feature set given')
+    scores = await asyncio.gather(*(score_vector(disease, vector) for disease, vector in vectors.items()))
+    return dict(zip(vectors, scores))
+
+
+def _add_disease_routes(disease, features_model):
+    # typed per-disease routes, so each endpoint validates and documents its own feature schema
+    batch_model = create_model(f"{features_model.__name__}Batch", rows=(List[features_model], ...))
+
+    async def predict_one(features: features_model):
+        return await score_vector(disease, _vector(disease, features))
+
+    async def predict_batch(request: batch_model):
+        # one predict_proba call for the whole batch
+        return await run_in_threadpool(score_vectors, disease, [_vector(disease, row) for row in request.rows])
+
+    app.post(f'/predict/{disease}', response_model=ScoreResponse, name=f'predict_{disease}')(predict_one)
+    app.post(f'/predict/{disease}/batch', response_model=List[ScoreResponse], name=f'predict_{disease}_batch')(predict_batch)
+
+
+for _disease, _features_model in FEATURE_MODELS.items():
+    _add_disease_routes(_disease, _features_model)
+
+
+@app.get('/patients/{patient_id}/predictions')
+async def patient_predictions(patient_id: int, suggestions: bool = True):
+    from prediction_service import predict_patient, prediction_result
+
+    def run():
+        return predict_patient(patient_id, get_batching_generator() if suggestions else None, None, suggestions)
+    result = prediction_result(await run_in_threadpool(run))
+    if result['patient'] is None:
+        raise HTTPException(404, f"No patient found with ID {patient_id}")
+    if result['missing']:
+        raise HTTPException(422, f"No {', '.join(result['missing'])} measurements stored for this patient")
+    return result
+
+
+@app.post('/suggestions', response_model=SuggestionResponse)
+async def suggestion(request: SuggestionRequest):
+    from health_suggestions import get_ai_health_suggestions
+    from prediction_service import SUGGESTION_NAMES
+
+    text = await run_in_threadpool(lambda: get_ai_health_suggestions(request.prediction, request.risk_category,
+                                                                     SUGGESTION_NAMES[request.disease], get_batching_generator()))
+    return SuggestionResponse(disease=request.disease, suggestion=text)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Serve the HealthPredictX models over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,84 +1,27 @@
 import os
-import pickle
 from unittest.util import _MAX_LENGTH
 import streamlit as st
 from streamlit_option_menu import option_menu
-from transformers import pipeline, AutoModelForCausalLM, AutoTokenizer
-import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
 from collections import Counter
 import re
 from auth import register_user, login_user, create_connection
+from text_generation import get_text_generator
+from health_suggestions import warm_suggestion_cache
+from jobs import FINISHED, JOB_TIMEOUT, NUM_WORKERS, get_worker_pool, job_timed_out, submit_job, wait_for_job
 from create_db import insert_patient_data, insert_diabetes_data, insert_heart_disease_data, insert_parkinsons_data, retrieve_patient_data, retrieve_parkinsons_data, retrieve_diabetes_data, retrieve_heart_disease_data
-from fpdf import FPDF
+from report import create_pdf
+import metrics
 import io
-from io import BytesIO
 
 # Set page configuration
 st.set_page_config(page_title="HealthPredictX",
                    layout="wide",
                    page_icon="🧑‍⚕️")
 
-#device = 0 if torch.cuda.is_available() else -1
-
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
 
-def create_pdf(patient_data):
-    # Initialize FPDF object
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Set font and title
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Comprehensive Medical Report", ln=True, align="C")
-    pdf.ln(10)  # Line break
-    
-    # Add patient details from the dictionary
-    pdf.cell(200, 10, txt=f"Name: {patient_data['Name']}", ln=True)
-    pdf.cell(200, 10, txt=f"Age: {patient_data['Age']}", ln=True)
-    pdf.cell(200, 10, txt=f"Sex: {patient_data['Sex']}", ln=True)
-    pdf.ln(5)  # Line break for better formatting
-    
-    # Add health assessment details
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(200, 10, txt="Diabetes Assessment:", ln=True)
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"  Verdict: {patient_data['Diabetes Verdict']}", ln=True)
-    pdf.cell(200, 10, txt=f"  Risk: {patient_data['Risk of Diabetes']}", ln=True)
-    #pdf.cell(200, 10, txt=f"  Treatment Suggestion: {patient_data['Diabetes Treatment Suggestion']}", ln=True)
-    pdf.multi_cell(0, 10, txt=f"  Treatment Suggestion: {patient_data['Diabetes Treatment Suggestion']}")
-    pdf.ln(5)  # Line break
-    
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(200, 10, txt="Heart Disease Assessment:", ln=True)
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"  Verdict: {patient_data['Heart Disease Verdict']}", ln=True)
-    pdf.cell(200, 10, txt=f"  Risk: {patient_data['Risk of Heart Disease']}", ln=True)
-    #pdf.cell(200, 10, txt=f"  Treatment Suggestion: {patient_data['Heart Disease Treatment Suggestion']}", ln=True)
-    pdf.multi_cell(0, 10, txt=f"  Treatment Suggestion: {patient_data['Heart Disease Treatment Suggestion']}")
-    pdf.ln(5)  # Line break
-    
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(200, 10, txt="Parkinson's Disease Assessment:", ln=True)
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"  Verdict: {patient_data['Parkinsons Verdict']}", ln=True)
-    pdf.cell(200, 10, txt=f"  Risk: {patient_data['Risk of Parkinsons']}", ln=True)
-    #pdf.cell(200, 10, txt=f"  Treatment Suggestion: {patient_data['Parkinsons Treatment Suggestion']}", ln=True)
-    pdf.multi_cell(0, 10, txt=f"  Treatment Suggestion: {patient_data['Parkinsons Treatment Suggestion']}")
-    pdf.ln(10)
-    
-    pdf.set_font("Arial", 'I', 10)
-    pdf.multi_cell(0, 10, txt="This report is based on preliminary health assessments and may require further clinical evaluation.")
-    
-    pdf_buffer = BytesIO()
-    
-    pdf_output = pdf.output(dest='S').encode('latin1')
-    pdf_buffer.write(pdf_output)
-    
-    pdf_buffer.seek(0)
-
-    return pdf_buffer
-
 def register():
     st.title("Register")
     username = st.text_input("Username")
@@ -111,23 +54,26 @@ def login():
             st.warning("Invalid username or password.")
 
 if st.session_state['logged_in']:
-    suggestion_generator = pipeline('text-generation', model='gpt2', device=0, max_length=50)
+    # GPT-2 is loaded once per process and runs on CPU unless a GPU is available
+    suggestion_generator = get_text_generator()
+
+    # Optionally generate all 18 (disease, prediction, risk) suggestions up front; cached ones are skipped
+    if os.environ.get('HPX_PREWARM_SUGGESTIONS') == '1':
+        warm_suggestion_cache(suggestion_generator)
+
+    # Predictions run in background worker processes; HPX_JOB_WORKERS=0 leaves that to `python jobs.py worker`
+    if NUM_WORKERS > 0:
+        get_worker_pool()
+
+    # HPX_METRICS=1 with HPX_METRICS_PORT set serves this process's latency histograms at /metrics
+    metrics.get_metrics_server()
+
+    def show_ttft():
+        # time to first token of the reply just streamed, and of recent replies in this process
+        stats = suggestion_generator.ttft_stats()
+        if stats['count']:
+            st.caption(f"First token after {stats['last']:.2f}s (p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s over {stats['count']} replies)")
 
-    def get_ai_health_suggestions(prediction, risk_level, disease):
-        
-        prompt = (f"The patient's prediction for {disease} is {'positive' if prediction==1 else 'negative'} and their risk level is {risk_level}. "
-              "Based on this, provide a recommendation on whether further testing is required.")
-    
-        generated_text = suggestion_generator(prompt, num_return_sequences=1)[0]['generated_text']
-        response_start = prompt.split('recommendation regarding further testing?')[0]
-        response = generated_text.replace(response_start, '').strip()
-        
-        # Post-process to ensure it's concise and returns only the first two sentences
-        sentences = response.split('. ')
-        result = '. '.join(sentences[:2]).strip()
-        
-        return result if result.endswith('.') else result + '.'
-    
     def identify_condition_in_query(query):
         conditions = ["diabetic", "heart disease", "parkinsons"]
         
@@ -137,19 +83,6 @@ if st.session_state['logged_in']:
         return None  # If no condition matches
 
         
-    # getting the working directory of the main.py
-    working_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # loading the saved models
-
-    #diabetes_model = pickle.load(open(f'{working_dir}/saved_models/diabetes_model.sav', 'rb'))
-    diabetes_model = pickle.load(open(f'{working_dir}/svc_diabetes.sav','rb'))
-
-    #heart_disease_model = pickle.load(open(f'{working_dir}/saved_models/heart_disease_model.sav', 'rb'))
-    heart_disease_model = pickle.load(open(f'{working_dir}/logistic_model_updated.sav', 'rb'))
-
-    parkinsons_model = pickle.load(open(f'{working_dir}/rf_model_updated.sav', 'rb'))
-
     # sidebar for navigation
     with st.sidebar:
         selected = option_menu('HealthPredictX',
@@ -444,83 +377,90 @@ if st.session_state['logged_in']:
         patient_id = st.text_input("Enter the Patient ID")
         #name = st.text_input("Enter the name of the patient")
         
-        # Submit button for predictions
+        # Submit button for predictions: queues a job for the background workers
         if st.button("Submit"):
             if patient_id:
-                # Retrieve patient and health data
-                patient_result = retrieve_patient_data(patient_id)
-                age = patient_result[2]
-                sex = '1' if patient_result[3] == 'Female' else '0'
-                diabetes_result = retrieve_diabetes_data(patient_id)
-                heart_result = retrieve_heart_disease_data(patient_id)
-                parkinson_result = retrieve_parkinsons_data(patient_id)
-                
-                # Process diabetes prediction
-                diabetes_input = [diabetes_result[2], diabetes_result[3], diabetes_result[4], diabetes_result[5], diabetes_result[6], diabetes_result[7], diabetes_result[8], age]
-                diabetes_input = [float(x) for x in diabetes_input]
-                diab_prediction = diabetes_model.predict([diabetes_input])
-                diab_prob = diabetes_model.predict_proba([diabetes_input])
-
-                if diab_prediction[0] == 1:
-                    diab_diagnosis = 'The patient is diabetic'
+                st.session_state['prediction_job'] = submit_job(patient_id)
+                st.session_state.pop('patient_data', None)
+
+        if 'prediction_job' in st.session_state:
+            job_id = st.session_state['prediction_job']
+            # wait up to a second, then rerun so the page keeps polling without holding the session
+            job = wait_for_job(job_id, timeout=1.0)
+            if job is None:
+                st.error(f"Prediction job {job_id} no longer exists.")
+                del st.session_state['prediction_job']
+            elif job_timed_out(job):
+                st.error(f"Prediction job {job_id} is still {job['status']} after {JOB_TIMEOUT:.0f}s; check that the prediction workers are running and try again.")
+                del st.session_state['prediction_job']
+            elif job['status'] not in FINISHED:
+                st.info(f"Prediction job {job_id} is {job['status']}...")
+                st.rerun()
+            elif job['status'] == 'failed':
+                st.error(f"Prediction failed: {job['error']}")
+            else:
+                result = job['result']
+                trace = result.get('trace')
+                if trace and st.session_state.get('traced_job') != job_id:
+                    # add the worker's timings to this process's histograms, once per job
+                    metrics.record_trace(trace)
+                    st.session_state['traced_job'] = job_id
+                if result['patient'] is None:
+                    st.error(f"No patient found with ID {job['patient_id']}.")
+                elif result['missing']:
+                    st.error(f"No {', '.join(disease.replace('_', ' ') for disease in result['missing'])} measurements stored for this patient yet.")
                 else:
-                    diab_diagnosis = 'The patient is not diabetic'
-
-                risk_score_d = diab_prob[0][1]
-                risk_category_d = 'Low Risk' if risk_score_d < 0.3 else 'Medium Risk' if 0.3 <= risk_score_d < 0.7 else 'High Risk'
-                st.success(diab_diagnosis)
-                st.write(f'Risk of developing diabetes: {risk_score_d:.2f} ({risk_category_d})')
-                ai_suggestions_d = get_ai_health_suggestions(diab_prediction[0], risk_category_d, 'Diabetes')
-                #print(ai_suggestions_d)
-
-                # Process heart disease prediction
-                heart_input = [age, heart_result[2], heart_result[3], heart_result[4], heart_result[5], heart_result[6], heart_result[7], heart_result[8], heart_result[9], sex, heart_result[10], heart_result[11]]
-                heart_input = [float(x) for x in heart_input]
-                heart_prediction = heart_disease_model.predict([heart_input])
-                heart_prob = heart_disease_model.predict_proba([heart_input])
-
-                if heart_prediction[0] == 1:
-                    heart_diagnosis = 'The patient is having heart disease and is at risk of heart failure'
-                else:
-                    heart_diagnosis = 'The patient does not have any heart disease'
-                    
-                risk_score_h = heart_prob[0][1]
-                risk_category_h = 'Low Risk' if risk_score_h < 0.3 else 'Medium Risk' if 0.3 <= risk_score_h < 0.7 else 'High Risk'
-                st.success(heart_diagnosis)
-                st.write(f'Risk of developing heart disease: {risk_score_h:.2f} ({risk_category_h})')
-                ai_suggestions_h = get_ai_health_suggestions(heart_prediction[0], risk_category_h, 'Heart Disease')
-
-                # Process Parkinson's prediction
-                parkinsons_input = [float(x) for x in parkinson_result[2:24]]  # Assuming indices 2-23 are relevant
-                parkinson_prediction = parkinsons_model.predict([parkinsons_input])
-                parkinson_prob = parkinsons_model.predict_proba([parkinsons_input])
-
-                if parkinson_prediction[0] == 1:
-                    parkinson_diagnosis = "The patient has Parkinson's disease"
-                else:
-                    parkinson_diagnosis = "The patient doesn't have Parkinson's disease"
-                    
-                risk_score_p = parkinson_prob[0][1]
-                risk_category_p = 'Low Risk' if risk_score_p < 0.3 else 'Medium Risk' if 0.3 <= risk_score_p < 0.7 else 'High Risk'
-                st.success(parkinson_diagnosis)
-                st.write(f'Risk of developing Parkinsons: {risk_score_p:.2f} ({risk_category_p})')
-                ai_suggestions_p = get_ai_health_suggestions(parkinson_prediction[0], risk_category_p, 'Parkinsons')
-
-                # Store the result in session state
-                st.session_state['patient_data'] = {
-                    'Name': patient_result[1],
-                    'Age': age,
-                    'Sex': patient_result[3],
-                    'Diabetes Verdict': diab_diagnosis,
-                    'Risk of Diabetes': f'Risk of developing diabetes: {risk_score_d:.2f} ({risk_category_d})',
-                    'Diabetes Treatment Suggestion': ai_suggestions_d,
-                    'Heart Disease Verdict': heart_diagnosis,
-                    'Risk of Heart Disease': f'Risk of developing heart disease: {risk_score_h:.2f} ({risk_category_h})',
-                    'Heart Disease Treatment Suggestion': ai_suggestions_h,
-                    'Parkinsons Verdict': parkinson_diagnosis,
-                    'Risk of Parkinsons': f'Risk of developing Parkinsons: {risk_score_p:.2f} ({risk_category_p})',
-                    'Parkinsons Treatment Suggestion': ai_suggestions_p
-                }
+                    patient = result['patient']
+
+                    # Process diabetes prediction
+                    diab_score = result['scores']['diabetes']
+                    diab_diagnosis = diab_score['verdict']
+                    risk_score_d = diab_score['risk_score']
+                    risk_category_d = diab_score['risk_category']
+                    st.success(diab_diagnosis)
+                    st.write(f'Risk of developing diabetes: {risk_score_d:.2f} ({risk_category_d})')
+
+                    # Process heart disease prediction
+                    heart_score = result['scores']['heart_disease']
+                    heart_diagnosis = heart_score['verdict']
+                    risk_score_h = heart_score['risk_score']
+                    risk_category_h = heart_score['risk_category']
+                    st.success(heart_diagnosis)
+                    st.write(f'Risk of developing heart disease: {risk_score_h:.2f} ({risk_category_h})')
+
+                    # Process Parkinson's prediction
+                    parkinson_score = result['scores']['parkinsons']
+                    parkinson_diagnosis = parkinson_score['verdict']
+                    risk_score_p = parkinson_score['risk_score']
+                    risk_category_p = parkinson_score['risk_category']
+                    st.success(parkinson_diagnosis)
+                    st.write(f'Risk of developing Parkinsons: {risk_score_p:.2f} ({risk_category_p})')
+
+                    ai_suggestions_d = result['suggestions']['diabetes']
+                    ai_suggestions_h = result['suggestions']['heart_disease']
+                    ai_suggestions_p = result['suggestions']['parkinsons']
+
+                    # Store the result in session state
+                    st.session_state['patient_data'] = {
+                        'Name': patient['name'],
+                        'Age': patient['age'],
+                        'Sex': patient['gender'],
+                        'Diabetes Verdict': diab_diagnosis,
+                        'Risk of Diabetes': f'Risk of developing diabetes: {risk_score_d:.2f} ({risk_category_d})',
+                        'Diabetes Treatment Suggestion': ai_suggestions_d,
+                        'Heart Disease Verdict': heart_diagnosis,
+                        'Risk of Heart Disease': f'Risk of developing heart disease: {risk_score_h:.2f} ({risk_category_h})',
+                        'Heart Disease Treatment Suggestion': ai_suggestions_h,
+                        'Parkinsons Verdict': parkinson_diagnosis,
+                        'Risk of Parkinsons': f'Risk of developing Parkinsons: {risk_score_p:.2f} ({risk_category_p})',
+                        'Parkinsons Treatment Suggestion': ai_suggestions_p
+                    }
+
+                # Per-request breakdown, only when the worker ran with HPX_METRICS=1
+                if trace:
+                    with st.expander("Request timing"):
+                        st.write(f"Queued for {job['queue_seconds']:.2f}s, ran in {job['run_seconds']:.2f}s on {job['worker']}")
+                        st.table(metrics.breakdown(trace))
 
         # Generate Medical Report Button - only enabled after submission
         if 'patient_data' in st.session_state:
@@ -565,20 +505,21 @@ if st.session_state['logged_in']:
                 st.session_state.chat_history = []
                 user_input = "" 
 
-            # Only generate a response if user_input is not empty and "Clear Chat" wasn't clicked
-            if user_input and 'chat_history' in st.session_state:
-                with st.spinner('Generating response...'):
-                    prompt = f"Patient's query: {user_input}\nHealthcare advice:"
-                    response = suggestion_generator(prompt, max_length=150, num_return_sequences=1, temperature=0.7)
-                    chatbot_reply = response[0]['generated_text'].strip()
-
-                    # Append to chat history as a dictionary
-                    st.session_state.chat_history.append({"user": user_input, "bot": chatbot_reply})
-
             for chat in st.session_state.chat_history:
                 st.markdown(f"**You:** {chat['user']}")
                 st.markdown(f"**HealthPredictX:** {chat['bot']}")
 
+            # Only generate a response if user_input is not empty and "Clear Chat" wasn't clicked
+            if user_input and 'chat_history' in st.session_state:
+                prompt = f"Patient's query: {user_input}\nHealthcare advice:"
+                st.markdown(f"**You:** {user_input}")
+                # Stream tokens into the chat view as they are generated instead of waiting for all 150
+                chatbot_reply = st.write_stream(suggestion_generator.stream(prompt, max_length=150, temperature=0.7)).strip()
+                show_ttft()
+
+                # Append to chat history as a dictionary
+                st.session_state.chat_history.append({"user": user_input, "bot": chatbot_reply})
+
         # Patient-Specific Queries Tab
         with tab2:
             st.header("Patient-Specific Queries")
@@ -606,9 +547,14 @@ if st.session_state['logged_in']:
                 st.session_state.patient_chat_history = []
                 patient_query = ""  # Clear input to avoid generating a new response
 
+            # Display chat history for patient-specific queries
+            for chat in st.session_state.patient_chat_history:
+                st.markdown(f"**Patient ID {chat['patient_id']} - You:** {chat['user']}")
+                st.markdown(f"**HealthPredictX:** {chat['bot']}")
+
             # Only generate a response if patient_query and patient_id are provided
             if patient_id and patient_query and 'patient_chat_history' in st.session_state:
-                with st.spinner('Fetching patient data and generating response...'):
+                with st.spinner('Fetching patient data...'):
 
                     condition = identify_condition_in_query(patient_query)
 
@@ -618,26 +564,23 @@ if st.session_state['logged_in']:
                         "parkinsons": retrieve_parkinsons_data
                     }
 
+                    patient_data = None
                     if condition and condition in condition_to_db:
-
                         patient_data = condition_to_db[condition](patient_id)
-                        
-                        if patient_data:
-                            # Generate patient-specific response using the fetched data
-                            prompt = f"Patient ID: {patient_id}, Query: {patient_query}\nPatient Data: {patient_data}\nHealthcare advice:"
-                            response = suggestion_generator(prompt, max_length=150, num_return_sequences=1)
-                            chatbot_reply = response[0]['generated_text'].strip()
-                            # Append to patient-specific chat history
-                            st.session_state.patient_chat_history.append({"patient_id": patient_id, "user": patient_query, "bot": chatbot_reply})
-                        else:
-                            chatbot_reply = f"Sorry, no data found for Patient ID {patient_id} related to {condition}."
-                    else:
-                        chatbot_reply = "Sorry, I'm not sure which condition you're asking about. Please try again."
 
-            # Display chat history for patient-specific queries
-            for chat in st.session_state.patient_chat_history:
-                st.markdown(f"**Patient ID {chat['patient_id']} - You:** {chat['user']}")
-                st.markdown(f"**HealthPredictX:** {chat['bot']}")
+                if condition and condition in condition_to_db:
+                    if patient_data:
+                        # Generate patient-specific response using the fetched data
+                        prompt = f"Patient ID: {patient_id}, Query: {patient_query}\nPatient Data: {patient_data}\nHealthcare advice:"
+                        st.markdown(f"**Patient ID {patient_id} - You:** {patient_query}")
+                        chatbot_reply = st.write_stream(suggestion_generator.stream(prompt, max_length=150)).strip()
+                        show_ttft()
+                        # Append to patient-specific chat history
+                        st.session_state.patient_chat_history.append({"patient_id": patient_id, "user": patient_query, "bot": chatbot_reply})
+                    else:
+                        chatbot_reply = f"Sorry, no data found for Patient ID {patient_id} related to {condition}."
+                else:
+                    chatbot_reply = "Sorry, I'm not sure which condition you're asking about. Please try again."
 
 else:
     choice = st.selectbox("Select an option", ["Login", "Register"])
@@ -0,0 +1,90 @@
+import argparse
+import time
+import numpy as np
+from create_db import DISEASE_FEATURES, PATIENT_FEATURES, get_connection, insert_predictions
+from model_registry import get_registry
+from scoring import score_batch
+
+def fetch_feature_rows(connection, disease, patient_ids):
+    # Latest measurement per patient for a whole chunk of patients in one set-based query
+    table, features = DISEASE_FEATURES[disease]
+    columns = ', '.join(PATIENT_FEATURES.get(name, f'm.{name}') for name in features)
+    placeholders = ', '.join('?' for _ in patient_ids)
+    # same "latest" as the retrieve_* functions: newest created_at, then highest id
+    query = f'''SELECT p.id, m.id, {columns}
+                FROM patients p
+                JOIN (SELECT *, ROW_NUMBER() OVER (PARTITION BY patient_id ORDER BY created_at DESC, id DESC) AS recency
+                      FROM {table} WHERE patient_id IN ({placeholders})) m ON m.patient_id = p.id AND m.recency = 1'''
+    return connection.execute(query, list(patient_ids)).fetchall()
+
+
+def score_rows(model, rows, disease):
+    # rows: [(patient_id, measurement_id, feature, ...), ...]; one predict_proba call for the whole chunk.
+    # NULL columns become NaN and are filled by the model's imputer, like at training time.
+    X = np.array([row[2:] for row in rows], dtype=float)
+    return [(row[0], row[1], score) for row, score in zip(rows, score_batch(model, X, disease))]
+
+
+def all_patient_ids(connection):
+    # Materialized up front: an open read cursor would block the predictions writes on the same file
+    return [row[0] for row in connection.execute("SELECT id FROM patients ORDER BY id")]
+
+
+def score_patients(patient_ids=None, chunk_size=500, write=True, diseases=None, registry=None):
+    # Scores every patient (or the given IDs) for each disease and optionally writes them to the predictions table.
+    # Returns {'predictions': [...], 'scored': {disease: n}, 'seconds': t}
+    registry = registry or get_registry()
+    diseases = diseases or list(DISEASE_FEATURES)
+    start = time.perf_counter()
+    scored = {disease: 0 for disease in diseases}
+    predictions = []
+
+    with get_connection() as connection:
+        patient_ids = all_patient_ids(connection) if patient_ids is None else list(patient_ids)
+
+        for offset in range(0, len(patient_ids), chunk_size):
+            chunk = patient_ids[offset:offset + chunk_size]
+            chunk_predictions = []
+            for disease in diseases:
+                entry = registry.get_entry(disease)
+                expected = len(DISEASE_FEATURES[disease][1])
+                if entry.feature_order is not None and len(entry.feature_order) != expected:
+                    raise ValueError(f"{disease} artifact expects {len(entry.feature_order)} features, batch scoring builds {expected}")
+                rows = fetch_feature_rows(connection, disease, chunk)
+                if not rows:
+                    continue
+                results = score_rows(entry.model, rows, disease)
+                scored[disease] += len(results)
+                for patient_id, measurement_id, score in results:
+                    chunk_predictions.append((patient_id, disease, entry.version, measurement_id,
+                                              score.prediction, score.risk_score, score.risk_category))
+            if write and chunk_predictions:
+                insert_predictions(chunk_predictions)
+            predictions.extend(chunk_predictions)
+
+    return {'predictions': predictions, 'scored': scored, 'seconds': time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score patients in bulk and store the results in the predictions table.')
+    parser.add_argument('patient_ids', nargs='*', type=int, help='Patient IDs to score (default: every patient)')
+    parser.add_argument('--ids-file', help='File with one patient ID per line')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--disease', action='append', choices=list(DISEASE_FEATURES), help='Only score these diseases')
+    parser.add_argument('--dry-run', action='store_true', help="Score but don't write to the predictions table")
+    args = parser.parse_args()
+
+    patient_ids = args.patient_ids or None
+    if args.ids_file:
+        with open(args.ids_file) as file:
+            patient_ids = (patient_ids or []) + [int(line) for line in file if line.strip()]
+
+    summary = score_patients(patient_ids, args.chunk_size, not args.dry_run, args.disease)
+    for disease, count in summary['scored'].items():
+        print(f"{disease}: {count} scored")
+    total = sum(summary['scored'].values())
+    print(f"{total} predictions in {summary['seconds']:.2f}s ({total / max(summary['seconds'], 1e-9):.0f}/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Benchmark suite for the serving paths: model load per .sav, single-row and batched predict_proba
+# per disease, SQLite insert/retrieve through create_db, PDF generation and GPT-2 tokens/sec.
+# Inputs are synthetic rows scaled up from the bundled CSVs. Results are latency percentiles; every
+# p50 is compared to a saved baseline (--baseline, else benchmark_baseline.json when present) and any
+# regression past --tolerance exits 1.
+BASELINE_PATH = 'benchmark_baseline.json'
+# the statistic compared against the baseline; p99 of a few hundred samples is too noisy to gate on
+GATED_STAT = 'p50_ms'
+# single-row predictions timed per disease (the 50-tree RF takes ~4ms each)
+SINGLE_ROW_SAMPLES = 500
+
+
+def synthetic_rows(disease, n, seed=0):
+    # Bootstrapped CSV rows with a little noise, kept inside each column's observed range.
+    # Integer columns (counts, 0/1 flags) stay integers.
+    from bulk_import import csv_feature_matrix
+
+    X = csv_feature_matrix(disease)
+    rng = np.random.default_rng(seed)
+    rows = X[rng.integers(0, len(X), n)]
+    rows = rows + rng.normal(0, 0.05, rows.shape) * X.std(axis=0)
+    rows = np.clip(rows, X.min(axis=0), X.max(axis=0))
+    integer_columns = np.all(X == np.round(X), axis=0)
+    rows[:, integer_columns] = np.round(rows[:, integer_columns])
+    return rows
+
+
+def summarize(name, samples, items=1):
+    # samples: seconds per call; items: rows (or tokens) handled per call
+    ms = np.asarray(samples) * 1000
+    return {
+        'name': name,
+        'n': len(ms),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'per_second': float(items * len(ms) / (ms.sum() / 1000)) if ms.sum() else None,
+    }
+
+
+def timed(fn, args_list, warmup=3):
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_models(rows, batch_size, repeats):
+    from model_registry import MODEL_FILES, _load_model_file, working_dir
+    from scoring import score_batch, score_one
+
+    results = []
+    for disease, file_name in MODEL_FILES.items():
+        path = os.path.join(working_dir, file_name)
+        # the registry's own unpickle path, imports included after the first (warm-up) load
+        results.append(summarize(f'model_load/{disease}', timed(lambda: _load_model_file(disease, path), [()] * repeats, warmup=1)))
+        model = _load_model_file(disease, path).model
+        X = rows[disease]
+        results.append(summarize(f'predict_single/{disease}', timed(lambda x: score_one(model, x, disease),
+                                                                    [(x,) for x in X[:SINGLE_ROW_SAMPLES]])))
+        # consecutive slices, wrapping around, so small --scale runs still get `repeats` batches
+        n_batches = max(repeats, len(X) // batch_size)
+        batches = [(np.take(X, np.arange(i * batch_size, (i + 1) * batch_size), axis=0, mode='wrap'),) for i in range(n_batches)]
+        results.append(summarize(f'predict_batch{batch_size}/{disease}', timed(lambda batch: score_batch(model, batch, disease), batches),
+                                 items=batch_size))
+    return results
+
+
+def bench_sqlite(rows, n_patients):
+    # against the throwaway database main() points HPX_HEALTH_DB at
+    import create_db
+    from create_db import DISEASE_FEATURES, PATIENT_FEATURES
+
+    inserts = {'diabetes': create_db.insert_diabetes_data, 'heart_disease': create_db.insert_heart_disease_data,
+               'parkinsons': create_db.insert_parkinsons_data}
+    retrieves = {'diabetes': create_db.retrieve_diabetes_data, 'heart_disease': create_db.retrieve_heart_disease_data,
+                 'parkinsons': create_db.retrieve_parkinsons_data}
+    results = []
+    patients = [(f'Patient {i}', 20 + i % 60, 'Female' if i % 2 else 'Male', f'{i} Main St', f'555-{i:07d}', f'p{i}@example.com')
+                for i in range(n_patients)]
+    results.append(summarize('sqlite_insert/patient', timed(create_db.insert_patient_data, patients, warmup=0)))
+    with create_db.get_connection() as connection:
+        patient_ids = [row[0] for row in connection.execute("SELECT id FROM patients ORDER BY id")]
+
+    for disease, insert in inserts.items():
+        # measurement columns only, in insert_*_data argument order; age and sex live on the patient
+        columns = [i for i, name in enumerate(DISEASE_FEATURES[disease][1]) if name not in PATIENT_FEATURES]
+        args = [(patient_id, *(float(value) for value in row[columns]))
+                for patient_id, row in zip(patient_ids, rows[disease][:len(patient_ids)])]
+        results.append(summarize(f'sqlite_insert/{disease}', timed(insert, args, warmup=0)))
+    for disease, retrieve in retrieves.items():
+        results.append(summarize(f'sqlite_retrieve/{disease}', timed(retrieve, [(patient_id,) for patient_id in patient_ids])))
+    results.append(summarize('sqlite_retrieve/snapshot', timed(create_db.get_patient_feature_snapshot,
+                                                               [(patient_id,) for patient_id in patient_ids])))
+    return results
+
+
+def bench_pdf(repeats):
+    from report import create_pdf
+
+    suggestion = 'Keep a balanced diet, exercise regularly and follow up with your physician. ' * 4
+    patient_data = {'Name': 'Benchmark Patient', 'Age': 54, 'Sex': 'Female'}
+    for label, key in (('Diabetes', 'Diabetes'), ('Heart Disease', 'Heart Disease'), ('Parkinsons', 'Parkinsons')):
+        patient_data[f'{key} Verdict'] = f'The patient does not have {label.lower()}'
+        patient_data[f'Risk of {key}'] = f'Risk of developing {label.lower()}: 0.42 (Medium Risk)'
+        patient_data[f'{key} Treatment Suggestion'] = suggestion
+    return [summarize('pdf/create_pdf', timed(create_pdf, [(patient_data,)] * repeats))]
+
+
+def bench_generation(model_name, max_new_tokens, repeats):
+    # greedy, fixed-length generations over the suggestion prompts; per_second is tokens/sec
+    import torch
+    from generation_benchmark import suggestion_prompts
+    from text_generation import TextGenerator
+
+    generator = TextGenerator(model_name)
+    tokenizer = generator.tokenizer
+
+    def generate(prompt):
+        inputs = tokenizer(prompt, return_tensors='pt').to(generator.model.device)
+        with torch.inference_mode():
+            generator.model.generate(**inputs, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                     do_sample=False, pad_token_id=tokenizer.pad_token_id)
+
+    prompts = [(prompt,) for prompt in suggestion_prompts()] * repeats
+    return [summarize(f'generation/{max_new_tokens}_tokens', timed(generate, prompts, warmup=1), items=max_new_tokens)]
+
+
+def environment():
+    import sklearn
+
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'sklearn': sklearn.__version__}
+
+
+def compare(baseline, results, tolerance):
+    # -> (regressions, missing); a benchmark regresses when its p50 is over baseline * (1 + tolerance)
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        if result['name'] in previous:
+            base = previous[result['name']][GATED_STAT]
+            if base and result[GATED_STAT] > base * (1 + tolerance):
+                regressions.append((result['name'], base, result[GATED_STAT]))
+    missing = sorted(set(previous) - {result['name'] for result in results})
+    return regressions, missing
+
+
+def run(scale=10, batch_size=256, patients=1000, repeats=20, text_model=None, max_new_tokens=20, seed=0, skip=()):
+    from bulk_import import SAMPLE_CSVS, csv_feature_matrix
+
+    rows = {disease: synthetic_rows(disease, max(scale * len(csv_feature_matrix(disease)), patients), seed) for disease in SAMPLE_CSVS}
+    results = []
+    if 'models' not in skip:
+        results += bench_models(rows, batch_size, repeats)
+    if 'sqlite' not in skip:
+        results += bench_sqlite(rows, patients)
+    if 'pdf' not in skip:
+        results += bench_pdf(repeats * 5)
+    if 'generation' not in skip:
+        try:
+            results += bench_generation(text_model, max_new_tokens, max(1, repeats // 20))
+        except (ImportError, OSError) as e:
+            # no torch/transformers, or the model isn't downloadable here
+            print(f"generation skipped: {e}", file=sys.stderr)
+    return results
+
+
+def main():
+    from text_generation import MODEL_NAME
+
+    groups = ('models', 'sqlite', 'pdf', 'generation')
+    parser = argparse.ArgumentParser(description='Benchmark model loading, scoring, SQLite, PDF and text generation.')
+    parser.add_argument('--scale', type=int, default=10, help='Synthetic rows per disease, as a multiple of the CSV size')
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--patients', type=int, default=1000, help='Patients written for the SQLite benchmarks')
+    parser.add_argument('--repeats', type=int, default=20, help='Model loads timed per .sav (PDFs: 5x this)')
+    parser.add_argument('--text-model', default=MODEL_NAME)
+    parser.add_argument('--max-new-tokens', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip', nargs='*', choices=groups, default=[], help='Benchmark groups to leave out')
+    parser.add_argument('--baseline', help=f'Compare with this saved run; regressions exit 1 (default: {BASELINE_PATH} if it exists)')
+    parser.add_argument('--no-baseline', action='store_true', help="Don't compare, even if the default baseline exists")
+    parser.add_argument('--save-baseline', nargs='?', const=BASELINE_PATH, help='Write this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help=f'Allowed {GATED_STAT} slowdown vs the baseline (default: 0.25)')
+    parser.add_argument('--json', action='store_true', help='Print the full results as JSON')
+    args = parser.parse_args()
+    if args.baseline is None and not args.no_baseline and os.path.exists(BASELINE_PATH):
+        args.baseline = BASELINE_PATH
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # create_db reads the path at import, so this has to be set before anything imports it
+        os.environ['HPX_HEALTH_DB'] = os.path.join(tmp_dir, 'benchmark.sqlite')
+        results = run(args.scale, args.batch_size, args.patients, args.repeats, args.text_model, args.max_new_tokens, args.seed,
+                      args.skip)
+        import create_db
+        create_db._pool.close()
+
+    report = {'environment': environment(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'benchmark':<34}{'n':>6}{'p50 ms':>11}{'p90 ms':>11}{'p99 ms':>11}{'per sec':>12}")
+        for result in results:
+            per_second = f"{result['per_second']:.1f}" if result['per_second'] else '-'
+            print(f"{result['name']:<34}{result['n']:>6}{result['p50_ms']:>11.3f}{result['p90_ms']:>11.3f}"
+                  f"{result['p99_ms']:>11.3f}{per_second:>12}")
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('environment') != report['environment']:
+            print(f"warning: baseline was recorded on a different environment: {baseline.get('environment')}", file=sys.stderr)
+        regressions, missing = compare(baseline, results, args.tolerance)
+        for name in missing:
+            print(f"warning: {name} is in the baseline but wasn't run", file=sys.stderr)
+        for name, base, current in regressions:
+            print(f"REGRESSION {name}: {GATED_STAT} {base:.3f} -> {current:.3f} ({current / base - 1:+.0%}, "
+                  f"tolerance {args.tolerance:.0%})", file=sys.stderr)
+        failed = bool(regressions)
+        if not failed:
+            print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from create_db import DISEASE_FEATURES, get_connection, read_patient_snapshot
+
+# CSV layout per kind: measurement table, CSV header -> table column, binary (0/1) columns and
+# the CSV columns that describe the patient. Matches diabetes.csv, heart_failure_clinical_records_dataset.csv
+# and parkinsons.csv; outcome columns (Outcome, DEATH_EVENT, status) are ignored.
+CSV_SPECS = {
+    'diabetes': {
+        'table': 'diabetes_data',
+        'columns': {'Pregnancies': 'pregnancies', 'Glucose': 'glucose', 'BloodPressure': 'blood_pressure',
+                    'SkinThickness': 'skin_thickness', 'Insulin': 'insulin', 'BMI': 'bmi',
+                    'DiabetesPedigreeFunction': 'diabetes_pedigree'},
+        'binary': [],
+        'patient': {'age': 'Age'},
+    },
+    'heart_disease': {
+        'table': 'heart_disease_data',
+        'columns': {'anaemia': 'anaemia', 'creatinine_phosphokinase': 'creatine', 'diabetes': 'diabetes',
+                    'ejection_fraction': 'ejection_fraction', 'high_blood_pressure': 'bp', 'platelets': 'platelets',
+                    'serum_creatinine': 'serum_creatinine', 'serum_sodium': 'serum_sodium', 'smoking': 'smoking',
+                    'time': 'follow_up'},
+        'binary': ['anaemia', 'diabetes', 'high_blood_pressure', 'smoking'],
+        'patient': {'age': 'age', 'gender': 'sex'},
+    },
+    'parkinsons': {
+        'table': 'parkinsons_data_1',
+        'columns': {'MDVP:Fo(Hz)': 'fo', 'MDVP:Fhi(Hz)': 'fhi', 'MDVP:Flo(Hz)': 'flo', 'MDVP:Jitter(%)': 'jitter_percent',
+                    'MDVP:Jitter(Abs)': 'jitter_abs', 'MDVP:RAP': 'rap', 'MDVP:PPQ': 'ppq', 'Jitter:DDP': 'ddp',
+                    'MDVP:Shimmer': 'shimmer', 'MDVP:Shimmer(dB)': 'shimmer_db', 'Shimmer:APQ3': 'apq3',
+                    'Shimmer:APQ5': 'apq5', 'MDVP:APQ': 'apq', 'Shimmer:DDA': 'dda', 'NHR': 'nhr', 'HNR': 'hnr',
+                    'RPDE': 'rpde', 'DFA': 'dfa', 'spread1': 'spread1', 'spread2': 'spread2', 'D2': 'd2', 'PPE': 'ppe'},
+        'binary': [],
+        'patient': {'name': 'name'},
+    },
+}
+
+PATIENT_COLUMNS = ['name', 'age', 'gender', 'address', 'phone_number', 'email']
+
+# the public datasets bundled with the repo, in CSV_SPECS layout
+SAMPLE_CSVS = {'diabetes': 'diabetes.csv', 'heart_disease': 'heart_failure_clinical_records_dataset.csv',
+               'parkinsons': 'parkinsons.csv'}
+
+
+def csv_feature_matrix(disease, path=None):
+    # CSV rows as model input: columns renamed and ordered like create_db.DISEASE_FEATURES
+    spec = CSV_SPECS[disease]
+    to_csv = {column: header for header, column in spec['columns'].items()}
+    to_csv.update({'age': spec['patient'].get('age'), 'sex': spec['patient'].get('gender')})
+    frame = pd.read_csv(path or os.path.join(os.path.dirname(os.path.abspath(__file__)), SAMPLE_CSVS[disease]))
+    return frame[[to_csv[name] for name in DISEASE_FEATURES[disease][1]]].to_numpy(dtype=float)
+
+
+def validate_chunk(chunk, spec, patient_id_column=None):
+    # Vectorized checks: every measurement column must parse as a number and binary columns must be 0/1.
+    # Returns (valid rows, number of rejected rows).
+    numeric = [*spec['columns']] + ([patient_id_column] if patient_id_column else [])
+    missing = [column for column in numeric if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+    values = chunk[numeric].apply(pd.to_numeric, errors='coerce')
+    ok = values.notna().all(axis=1)
+    for column in spec['binary']:
+        ok &= values[column].isin([0, 1])
+    valid = chunk.loc[ok].copy()
+    valid[numeric] = values.loc[ok]
+    return valid, int((~ok).sum())
+
+
+def _patient_rows(chunk, spec, kind, source):
+    fields = spec['patient']
+    n = len(chunk)
+    name = chunk[fields['name']].astype(str) if 'name' in fields else pd.Series([f"Imported {kind} {source}"] * n, index=chunk.index)
+    age = pd.to_numeric(chunk[fields['age']], errors='coerce') if 'age' in fields else pd.Series([np.nan] * n, index=chunk.index)
+    if 'gender' in fields:
+        # the public heart failure dataset codes sex as 1 = male, 0 = female
+        gender = np.where(pd.to_numeric(chunk[fields['gender']], errors='coerce') == 1, 'Male', 'Female')
+    else:
+        gender = [None] * n
+    age = [None if pd.isna(value) else int(value) for value in age]
+    return list(zip(name, age, gender, [None] * n, [None] * n, [None] * n))
+
+
+def _insert_patients(connection, rows, created_at):
+    # AUTOINCREMENT ids are handed out consecutively while we hold the write lock,
+    # so the new ids are the next len(rows) values of the table's sequence
+    before = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'patients'").fetchone()
+    first = (before[0] if before else 0) + 1
+    connection.executemany(f"INSERT INTO patients ({', '.join(PATIENT_COLUMNS)}, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           [row + (created_at,) for row in rows])
+    after = connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'patients'").fetchone()[0]
+    if after != first + len(rows) - 1:
+        raise RuntimeError("patient ids were not allocated consecutively")
+    return list(range(first, after + 1))
+
+
+def import_chunk(connection, chunk, kind, patient_id_column=None, source=''):
+    spec = CSV_SPECS[kind]
+    valid, rejected = validate_chunk(chunk, spec, patient_id_column)
+    if valid.empty:
+        return 0, rejected
+    created_at = str(datetime.now())
+    table_columns = list(spec['columns'].values())
+    query = f'''INSERT INTO {spec['table']} (patient_id, {', '.join(table_columns)}, created_at)
+                VALUES ({', '.join('?' for _ in range(len(table_columns) + 2))})'''
+
+    # One transaction per chunk: a commit per row is what limits SQLite to a few hundred rows/sec
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        if patient_id_column:
+            patient_ids = valid[patient_id_column].astype(int).tolist()
+        else:
+            patient_ids = _insert_patients(connection, _patient_rows(valid, spec, kind, source), created_at)
+        measurements = valid[list(spec['columns'])].astype(object).to_numpy().tolist()
+        connection.executemany(query, [(patient_id, *values, created_at) for patient_id, values in zip(patient_ids, measurements)])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return len(valid), rejected
+
+
+def import_patients_chunk(connection, chunk):
+    missing = [column for column in PATIENT_COLUMNS if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+    age = pd.to_numeric(chunk['age'], errors='coerce')
+    ok = chunk['name'].notna() & age.notna()
+    valid = chunk.loc[ok, PATIENT_COLUMNS].astype(object).where(chunk.loc[ok, PATIENT_COLUMNS].notna(), None)
+    valid['age'] = age[ok].astype(int)
+    created_at = str(datetime.now())
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany(f"INSERT INTO patients ({', '.join(PATIENT_COLUMNS)}, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               [tuple(row) + (created_at,) for row in valid.itertuples(index=False)])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return len(valid), int((~ok).sum())
+
+
+def import_csv(kind, path, chunk_size=5000, patient_id_column=None, progress=None):
+    # Streams the CSV in chunks; returns {'imported': n, 'rejected': n, 'seconds': t, 'rows_per_second': r}
+    start = time.perf_counter()
+    imported = rejected = 0
+    with get_connection() as connection:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            if kind == 'patients':
+                done, bad = import_patients_chunk(connection, chunk)
+            else:
+                done, bad = import_chunk(connection, chunk, kind, patient_id_column, source=path)
+            imported += done
+            rejected += bad
+            if progress:
+                progress(imported, rejected, time.perf_counter() - start)
+    seconds = time.perf_counter() - start
+    return {'imported': imported, 'rejected': rejected, 'seconds': seconds, 'rows_per_second': imported / max(seconds, 1e-9)}
+
+
+def check_round_trip(kind, path=None, rows=200):
+    # Imports the first rows of a CSV into a throwaway database, reads each patient back through the
+    # serving snapshot and compares its feature vector with the CSV row (catches column or encoding
+    # mismatches such as sex). Returns {'rows': n, 'mismatches': [(csv row, feature, csv value, served value), ...]}
+    from migrate_db import migrate
+
+    path = path or os.path.join(os.path.dirname(os.path.abspath(__file__)), SAMPLE_CSVS[kind])
+    chunk = pd.read_csv(path, nrows=rows)
+    valid, _ = validate_chunk(chunk, CSV_SPECS[kind], None)
+    expected = csv_feature_matrix(kind, path)[:rows][chunk.index.isin(valid.index)]
+    names = DISEASE_FEATURES[kind][1]
+    if 'age' in names:
+        # patients.age holds whole years, as entered in the app (_patient_rows truncates)
+        expected[:, names.index('age')] = np.trunc(expected[:, names.index('age')])
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        connection = sqlite3.connect(os.path.join(tmp_dir, 'round_trip.sqlite'))
+        try:
+            migrate(connection)
+            import_chunk(connection, valid, kind, source=path)
+            patient_ids = [row[0] for row in connection.execute("SELECT id FROM patients ORDER BY id")]
+            for index, patient_id, csv_row in zip(valid.index, patient_ids, expected):
+                served = np.array(read_patient_snapshot(connection, patient_id).features(kind))
+                for name, csv_value, served_value in zip(names, csv_row, served):
+                    # a column the CSV doesn't have is NULL and served as NaN for the imputer
+                    if not np.isclose(csv_value, served_value, equal_nan=True) and not np.isnan(served_value):
+                        mismatches.append((int(index), name, float(csv_value), float(served_value)))
+        finally:
+            connection.close()
+    return {'rows': len(valid), 'mismatches': mismatches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load patients or measurements from CSV into the health database.')
+    parser.add_argument('kind', choices=['patients', *CSV_SPECS])
+    parser.add_argument('path', nargs='?', help='CSV to import (with --check: defaults to the bundled dataset)')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--patient-id-column',
+                        help='Column holding existing patient IDs; without it a patient is created for every row')
+    parser.add_argument('--quiet', action='store_true')
+    parser.add_argument('--check', action='store_true',
+                        help='Import into a throwaway database and compare the served feature vectors with the CSV rows')
+    args = parser.parse_args()
+
+    if args.check:
+        if args.kind == 'patients':
+            parser.error('--check needs a measurement kind')
+        result = check_round_trip(args.kind, args.path)
+        for row, name, csv_value, served_value in result['mismatches'][:20]:
+            print(f"row {row}: {name} is {csv_value} in the CSV but served as {served_value}")
+        print(f"{args.kind}: {result['rows']} rows, {len(result['mismatches'])} mismatched values")
+        raise SystemExit(1 if result['mismatches'] else 0)
+    if not args.path:
+        parser.error('path is required')
+
+    def progress(imported, rejected, seconds):
+        print(f"{imported} rows imported, {rejected} rejected ({imported / max(seconds, 1e-9):.0f} rows/s)")
+
+    summary = import_csv(args.kind, args.path, args.chunk_size, args.patient_id_column, None if args.quiet else progress)
+    print(f"Done: {summary['imported']} rows imported, {summary['rejected']} rejected in {summary['seconds']:.2f}s "
+          f"({summary['rows_per_second']:.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import argparse
+import os
+import sys
+import numpy as np
+
+# sklearn-free inference for the linear and tree models: a fitted LogisticRegression (with any
+# StandardScaler in front folded into its coefficients) or RandomForest is flattened into plain
+# NumPy arrays, imputer medians included, and saved as .npz. Serving them only needs NumPy, so workers
+# skip importing sklearn and predict_proba's per-call validation. Build with `python compiled_models.py compile`.
+
+COMPILED_DIR = 'compiled'
+
+
+def _empty_if_none(array):
+    return np.array([]) if array is None else array
+
+
+def _none_if_empty(array, dtype=float):
+    return None if array is None or np.size(array) == 0 else np.asarray(array, dtype=dtype)
+
+
+def impute(X, values, zero_as_missing):
+    # same rule as preprocessing.ZeroAsMissingImputer.transform
+    if values is None:
+        return X
+    missing = np.isnan(X) | (zero_as_missing & (X == 0))
+    return np.where(missing, values, X)
+
+
+class CompiledLinear:
+    # Binary logistic regression: P(class 1) = sigmoid(X @ coef + intercept)
+
+    def __init__(self, coef, intercept, classes, impute_values=None, impute_zero=None):
+        self.coef = np.asarray(coef, dtype=float)
+        self.intercept = float(intercept)
+        self.classes_ = np.asarray(classes)
+        self.impute_values = _none_if_empty(impute_values)
+        self.impute_zero = _none_if_empty(impute_zero, bool)
+
+    def predict_proba(self, X):
+        X = impute(np.asarray(X, dtype=float), self.impute_values, self.impute_zero)
+        positive = 1.0 / (1.0 + np.exp(-(X @ self.coef + self.intercept)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def arrays(self):
+        return {'coef': self.coef, 'intercept': np.array(self.intercept),
+                'impute_values': _empty_if_none(self.impute_values), 'impute_zero': _empty_if_none(self.impute_zero)}
+
+    @classmethod
+    def from_arrays(cls, arrays, classes):
+        return cls(arrays['coef'], arrays['intercept'], classes, arrays['impute_values'], arrays['impute_zero'])
+
+
+class CompiledForest:
+    # Every tree's nodes concatenated into flat arrays. Leaves point at themselves, so all trees
+    # can be walked in lockstep for max_depth steps without checking which rows have finished.
+
+    def __init__(self, roots, left, right, feature, threshold, value, max_depth, classes, mean=None, scale=None,
+                 impute_values=None, impute_zero=None):
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        # optional StandardScaler applied before the trees
+        self.mean = _none_if_empty(mean)
+        self.scale = _none_if_empty(scale)
+        self.impute_values = _none_if_empty(impute_values)
+        self.impute_zero = _none_if_empty(impute_zero, bool)
+
+    def predict_proba(self, X):
+        X = impute(np.asarray(X, dtype=float), self.impute_values, self.impute_zero)
+        if self.mean is not None:
+            X = (X - self.mean) / self.scale
+        # sklearn compares float32 feature values against float64 thresholds
+        X = X.astype(np.float32)
+        rows = np.arange(X.shape[0])[None, :]
+        nodes = np.repeat(self.roots[:, None], X.shape[0], axis=1)  # (n_trees, n_rows)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=0)
+
+    def arrays(self):
+        return {'roots': self.roots, 'left': self.left, 'right': self.right, 'feature': self.feature,
+                'threshold': self.threshold, 'value': self.value, 'max_depth': np.array(self.max_depth),
+                'mean': _empty_if_none(self.mean), 'scale': _empty_if_none(self.scale),
+                'impute_values': _empty_if_none(self.impute_values), 'impute_zero': _empty_if_none(self.impute_zero)}
+
+    @classmethod
+    def from_arrays(cls, arrays, classes):
+        return cls(arrays['roots'], arrays['left'], arrays['right'], arrays['feature'], arrays['threshold'],
+                   arrays['value'], arrays['max_depth'], classes, arrays['mean'], arrays['scale'],
+                   arrays['impute_values'], arrays['impute_zero'])
+
+
+KINDS = {'linear': CompiledLinear, 'forest': CompiledForest}
+
+
+def _split_pipeline(model):
+    # -> (ZeroAsMissingImputer or None, StandardScaler or None, final estimator), in that order
+    steps = getattr(model, 'steps', None)
+    if steps is None:
+        return None, None, model
+    imputer = scaler = None
+    for name, step in steps[:-1]:
+        if step is None or step == 'passthrough':
+            continue
+        kind = type(step).__name__
+        if kind == 'ZeroAsMissingImputer' and imputer is None and scaler is None:
+            imputer = step
+        elif kind == 'StandardScaler' and scaler is None:
+            scaler = step
+        else:
+            raise ValueError(f"can't compile pipeline step '{name}' ({kind})")
+    return imputer, scaler, steps[-1][1]
+
+
+def _imputer_arrays(imputer, n_features):
+    if imputer is None:
+        return None, None
+    zero_as_missing = np.zeros(n_features, dtype=bool)
+    zero_as_missing[list(imputer.zero_as_missing)] = True
+    return imputer.statistics_, zero_as_missing
+
+
+def _scaler_arrays(scaler, n_features):
+    mean = scaler.mean_ if scaler is not None and scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler is not None and scaler.with_std else np.ones(n_features)
+    return mean, scale
+
+
+def compile_model(model):
+    imputer, scaler, estimator = _split_pipeline(model)
+    kind = type(estimator).__name__
+    if len(estimator.classes_) != 2:
+        raise ValueError(f"only binary classifiers can be compiled, got {len(estimator.classes_)} classes")
+    impute_values, impute_zero = _imputer_arrays(imputer, estimator.n_features_in_)
+
+    if kind == 'LogisticRegression':
+        coef = estimator.coef_[0]
+        intercept = estimator.intercept_[0]
+        if scaler is not None:
+            # (x - mean) / scale @ coef == x @ (coef / scale) - mean @ (coef / scale)
+            mean, scale = _scaler_arrays(scaler, len(coef))
+            coef = coef / scale
+            intercept = intercept - mean @ coef
+        return CompiledLinear(coef, intercept, estimator.classes_, impute_values, impute_zero)
+
+    if kind in ('RandomForestClassifier', 'ExtraTreesClassifier', 'DecisionTreeClassifier'):
+        trees = [tree.tree_ for tree in getattr(estimator, 'estimators_', [estimator])]
+        roots, left, right, feature, threshold, value = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            node_ids = np.arange(tree.node_count) + offset
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+            counts = tree.value[:, 0, :]
+            value.append(counts / counts.sum(axis=1, keepdims=True))
+            offset += tree.node_count
+        mean, scale = (None, None) if scaler is None else _scaler_arrays(scaler, estimator.n_features_in_)
+        return CompiledForest(roots, np.concatenate(left), np.concatenate(right), np.concatenate(feature),
+                              np.concatenate(threshold), np.concatenate(value), max(tree.max_depth for tree in trees),
+                              estimator.classes_, mean, scale, impute_values, impute_zero)
+
+    raise ValueError(f"can't compile {kind}; only LogisticRegression and tree ensembles are supported")
+
+
+def save_compiled(path, compiled, source_version, feature_order=None):
+    kind = next(name for name, cls in KINDS.items() if isinstance(compiled, cls))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.savez(path, kind=np.array(kind), classes=compiled.classes_, source_version=np.array(source_version),
+             feature_order=np.array(feature_order or [], dtype=str), **compiled.arrays())
+
+
+def load_compiled(path):
+    # -> (compiled model, version of the .sav it was compiled from, feature order or None)
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    compiled = KINDS[str(arrays['kind'])].from_arrays(arrays, arrays['classes'])
+    feature_order = [str(name) for name in arrays['feature_order']] or None
+    return compiled, str(arrays['source_version']), feature_order
+
+
+def compiled_path(model_path, compiled_dir=None):
+    directory = compiled_dir or os.path.join(os.path.dirname(model_path), COMPILED_DIR)
+    return os.path.join(directory, os.path.splitext(os.path.basename(model_path))[0] + '.npz')
+
+
+def parity_rows(disease, n_random=2000, seed=0):
+    # Rows from the training CSV plus random rows spread over the same ranges
+    from bulk_import import csv_feature_matrix
+
+    X = csv_feature_matrix(disease)
+    rng = np.random.default_rng(seed)
+    random_rows = rng.uniform(X.min(axis=0), X.max(axis=0), size=(n_random, X.shape[1]))
+    return np.vstack([X, random_rows])
+
+
+def check_parity(model, compiled, X, atol=1e-9):
+    # Compiled vs sklearn probabilities and labels on the same rows
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X)
+    max_diff = float(np.abs(expected - actual).max())
+    label_mismatches = int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum())
+    return {'rows': len(X), 'max_abs_diff': max_diff, 'label_mismatches': label_mismatches,
+            'ok': max_diff <= atol and label_mismatches == 0}
+
+
+def main():
+    from model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description='Compile the linear/tree models to NumPy arrays and check parity with sklearn.')
+    parser.add_argument('command', choices=['compile', 'check'])
+    parser.add_argument('diseases', nargs='*', default=['heart_disease', 'parkinsons'])
+    parser.add_argument('--atol', type=float, default=1e-9, help='Largest allowed probability difference')
+    args = parser.parse_args()
+
+    # always the sklearn models, whatever HPX_COMPILED_MODELS says
+    registry = ModelRegistry(use_compiled=False)
+    failed = False
+    for disease in args.diseases:
+        entry = registry.get_entry(disease)
+        path = compiled_path(entry.path)
+        if args.command == 'compile':
+            compiled = compile_model(entry.model)
+            save_compiled(path, compiled, entry.version, entry.feature_order)
+        else:
+            if not os.path.exists(path):
+                print(f"{disease}: {path} doesn't exist; run `python compiled_models.py compile` first")
+                failed = True
+                continue
+            compiled, source_version, _ = load_compiled(path)
+            if source_version != entry.version:
+                print(f"{disease}: {path} was compiled from version {source_version}, current model is {entry.version}")
+                failed = True
+                continue
+        result = check_parity(entry.model, compiled, parity_rows(disease), args.atol)
+        failed |= not result['ok']
+        print(f"{disease}: {path} - {result['rows']} rows, max |diff| {result['max_abs_diff']:.2e}, "
+              f"{result['label_mismatches']} label mismatches {'OK' if result['ok'] else 'FAILED'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
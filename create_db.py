@@ -1,181 +1,231 @@
+import os
+import queue
 import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
+from typing import NamedTuple, Optional
+from metrics import DB_SECONDS, timed
 
-conn = sqlite3.connect('health_db.sqlite')
-c = conn.cursor()
-c.execute("SELECT * FROM patients")
-patients = c.fetchall()
-for patient in patients:
-    print(patient)
+DB_PATH = os.environ.get('HPX_HEALTH_DB', 'health_db.sqlite')
+POOL_SIZE = int(os.environ.get('HPX_DB_POOL_SIZE', '8'))
+# Apply pending schema migrations on the first pooled connection; set to 0 to require `python migrate_db.py migrate`
+AUTO_MIGRATE = os.environ.get('HPX_AUTO_MIGRATE', '1') == '1'
 
-with sqlite3.connect('health_db.sqlite') as connection:  # replace with your database path
-        cursor = connection.cursor()
-        
-        # Run the PRAGMA command
-        cursor.execute("PRAGMA table_info(parkinsons_data_1);")
-        
-        # Fetch all results
-        schema_info = cursor.fetchall()
-        
-        # Print the schema information
-        for column in schema_info:
-            print(column)
+# WAL lets readers run alongside a writer instead of failing with "database is locked";
+# NORMAL sync is durable enough under WAL and avoids an fsync per commit.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache per connection
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+]
+
+# Feature columns per disease, in the order the models were trained on.
+# 'age' and 'sex' come from the patients table, everything else from the measurement table.
+DISEASE_FEATURES = {
+    'diabetes': ('diabetes_data', ['pregnancies', 'glucose', 'blood_pressure', 'skin_thickness', 'insulin', 'bmi', 'diabetes_pedigree', 'age']),
+    'heart_disease': ('heart_disease_data', ['age', 'anaemia', 'creatine', 'diabetes', 'ejection_fraction', 'bp', 'platelets',
+                                             'serum_creatinine', 'serum_sodium', 'sex', 'smoking', 'follow_up']),
+    'parkinsons': ('parkinsons_data_1', ['fo', 'fhi', 'flo', 'jitter_percent', 'jitter_abs', 'rap', 'ppq', 'ddp', 'shimmer',
+                                         'shimmer_db', 'apq3', 'apq5', 'apq', 'dda', 'nhr', 'hnr', 'rpde', 'dfa',
+                                         'spread1', 'spread2', 'd2', 'ppe']),
+}
+
+PATIENT_FEATURES = {
+    'age': 'p.age',
+    # as in the heart failure training data: 1 = male, 0 = female
+    'sex': "CASE WHEN p.gender = 'Male' THEN 1 ELSE 0 END",
+}
+
+class PooledConnection(sqlite3.Connection):
+    # Remembers its cursors so the pool can reset them. A half-read SELECT (fetchone) keeps a
+    # WAL read snapshot open, and the next writer on this connection would fail with "database is locked".
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cursors = weakref.WeakSet()
+
+    def cursor(self, *args, **kwargs):
+        cursor = super().cursor(*args, **kwargs)
+        self._cursors.add(cursor)
+        return cursor
+
+    def close_cursors(self):
+        for cursor in list(self._cursors):
+            cursor.close()
 
 def create_connection():
-    connection = sqlite3.connect('health_db.sqlite', check_same_thread=False, timeout=5)
+    # cached_statements keeps prepared statements around for as long as the connection lives
+    connection = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=5, cached_statements=256,
+                                 factory=PooledConnection)
+    for pragma in PRAGMAS:
+        connection.execute(pragma)
     return connection
 
-def create_tables():
-    c.execute('''CREATE TABLE IF NOT EXISTS patients (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL,
-                        age INTEGER,
-                        gender TEXT,
-                        address TEXT,
-                        phone_number TEXT,
-                        email TEXT,
-                        created_at TEXT
-                      );''')
-
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS diabetes_data (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        patient_id INTEGER,
-                        pregnancies INTEGER,
-                        glucose INTEGER,
-                        blood_pressure INTEGER,
-                        skin_thickness INTEGER,
-                        insulin INTEGER,
-                        bmi REAL,
-                        diabetes_pedigree REAL,
-                        created_at TEXT,
-                        FOREIGN KEY(patient_id) REFERENCES patients(id)
-                      );''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS heart_disease_data (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        patient_id INTEGER,
-                        anaemia INTEGER CHECK (anaemia IN (0,1)),
-                        creatine INTEGER,
-                        diabetes INTEGER CHECK (diabetes IN (0,1)),
-                        ejection_fraction INTEGER,
-                        bp INTEGER CHECK (bp IN (0,1)),
-                        platelets INTEGER,
-                        serum_creatinine REAL,
-                        serum_sodium INTEGER,
-                        smoking INTEGER CHECK (smoking IN (0,1)),
-                        follow_up INTEGER,
-                        FOREIGN KEY(patient_id) REFERENCES patients(id)
-                      );''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS parkinsons_data_1 (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        patient_id INTEGER,
-                        fo REAL,  -- MDVP:Fo(Hz)
-                        fhi REAL, -- MDVP:Fhi(Hz)
-                        flo REAL, -- MDVP:Flo(Hz)
-                        jitter_percent REAL, -- MDVP:Jitter(%)
-                        jitter_abs REAL, -- MDVP:Jitter(Abs)
-                        rap REAL, -- MDVP:RAP
-                        ppq REAL, -- MDVP:PPQ
-                        ddp REAL, -- Jitter:DDP
-                        shimmer REAL, -- MDVP:Shimmer
-                        shimmer_db REAL, -- MDVP:Shimmer(dB)
-                        apq3 REAL, -- Shimmer:APQ3
-                        apq5 REAL, -- Shimmer:APQ5
-                        apq REAL, -- MDVP:APQ
-                        dda REAL, -- Shimmer:DDA
-                        nhr REAL, -- NHR
-                        hnr REAL, -- HNR
-                        rpde REAL, -- RPDE
-                        dfa REAL, -- DFA
-                        spread1 REAL, -- spread1
-                        spread2 REAL, -- spread2
-                        d2 REAL, -- D2
-                        ppe REAL, -- PPE
-                        created_at TEXT,
-                        FOREIGN KEY(patient_id) REFERENCES patients(id)
-                      );''')
-
-    conn.commit()
+class ConnectionPool:
+    # Bounded pool of long-lived connections shared by every Streamlit session thread
 
-def insert_patient_data(name, age, gender, address, phone_number, email):
-    with create_connection() as connection:
+    def __init__(self, size=POOL_SIZE, timeout=5):
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._migrated = False
+        self._lock = threading.Lock()
+        self._migrate_lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            connection = None
+            try:
+                connection = create_connection()
+                if AUTO_MIGRATE and not self._migrated:
+                    with self._migrate_lock:
+                        if not self._migrated:
+                            # cheap after the first run: just reads PRAGMA user_version
+                            from migrate_db import migrate
+                            migrate(connection)
+                            self._migrated = True
+                return connection
+            except Exception:
+                # a connection whose migration failed never reaches the pool, so close it here
+                if connection is not None:
+                    connection.close()
+                with self._lock:
+                    self._created -= 1
+                raise
         try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"no free database connection after {self.timeout}s")
+
+    def release(self, connection):
+        connection.close_cursors()
+        if connection.in_transaction:
+            connection.rollback()
+        self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+_pool = ConnectionPool()
+
+@contextmanager
+def get_connection():
+    # Borrow a pooled connection; commits on success, rolls back on error, then returns it to the pool
+    connection = _pool.acquire()
+    try:
+        with connection:
+            yield connection
+    finally:
+        _pool.release(connection)
+
+@timed(DB_SECONDS)
+def insert_patient_data(name, age, gender, address, phone_number, email):
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
             query = "INSERT INTO patients (name, age, gender, address, phone_number, email, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
             c.execute(query, (name, int(age), gender, address, phone_number, email, datetime.now()))
             connection.commit()
             return True
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return False
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return False
         
+@timed(DB_SECONDS)
 def retrieve_patient_data(name):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
             query = "SELECT * FROM patients WHERE id = ?"
             c.execute(query, (name,))
             patient_data = c.fetchone()
             return patient_data
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return None
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return None
 
+@timed(DB_SECONDS)
 def insert_diabetes_data(patient_id, pregnancies, glucose, blood_pressure, skin_thickness, insulin, bmi, diabetes_pedigree):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
             query = '''INSERT INTO diabetes_data (patient_id, pregnancies, glucose, blood_pressure, skin_thickness, insulin, bmi, diabetes_pedigree, created_at) 
                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
             c.execute(query, (patient_id, pregnancies, glucose, blood_pressure, skin_thickness, insulin, bmi, diabetes_pedigree, datetime.now()))
             connection.commit()
             return True
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return False
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return False
 
+@timed(DB_SECONDS)
 def retrieve_diabetes_data(patient_id):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
-            query = "SELECT * FROM diabetes_data WHERE patient_id = ?"
+            # latest measurement for the patient, served by the (patient_id, created_at) index
+            query = "SELECT * FROM diabetes_data WHERE patient_id = ? ORDER BY created_at DESC, id DESC LIMIT 1"
             c.execute(query, (patient_id,))
             diabetes_data = c.fetchone()
             return diabetes_data
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return None
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return None
 
+@timed(DB_SECONDS)
 def insert_heart_disease_data(patient_id, anaemia, creatine, diabetes, ejection_fraction, bp, platelets, serum_creatinine, serum_sodium, smoking, follow_up):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
-            query = '''INSERT INTO heart_disease_data (patient_id, anaemia, creatine, diabetes, ejection_fraction, bp, platelets, serum_creatinine, serum_sodium, smoking, follow_up) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
-            c.execute(query, (patient_id, anaemia, creatine, diabetes, ejection_fraction, bp, platelets, serum_creatinine, serum_sodium, smoking, follow_up))
+            query = '''INSERT INTO heart_disease_data (patient_id, anaemia, creatine, diabetes, ejection_fraction, bp, platelets, serum_creatinine, serum_sodium, smoking, follow_up, created_at) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+            c.execute(query, (patient_id, anaemia, creatine, diabetes, ejection_fraction, bp, platelets, serum_creatinine, serum_sodium, smoking, follow_up, datetime.now()))
             connection.commit()
             return True
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return False
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return False
 
+@timed(DB_SECONDS)
 def retrieve_heart_disease_data(patient_id):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
-            query = "SELECT * FROM heart_disease_data WHERE patient_id = ?"
+            # latest measurement for the patient, served by the (patient_id, created_at) index
+            query = "SELECT * FROM heart_disease_data WHERE patient_id = ? ORDER BY created_at DESC, id DESC LIMIT 1"
             c.execute(query, (patient_id,))
             heart_disease_data = c.fetchone()
             return heart_disease_data
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return None
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return None
 
+@timed(DB_SECONDS)
 def insert_parkinsons_data(patient_id, fo, fhi, flo, jitter_percent, jitter_abs, rap, ppq, ddp, shimmer, shimmer_db, apq3, apq5, apq, dda, nhr, hnr, rpde, dfa, spread1, spread2, d2, ppe):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
 
 
@@ -192,18 +242,121 @@ def insert_parkinsons_data(patient_id, fo, fhi, flo, jitter_percent, jitter_abs,
 
             connection.commit()
             return True
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
-            return False
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return False
 
+@timed(DB_SECONDS)
 def retrieve_parkinsons_data(patient_id):
-    with create_connection() as connection:
-        try:
+    try:
+        with get_connection() as connection:
             c = connection.cursor()
-            query = "SELECT * FROM parkinsons_data_1 WHERE patient_id = ?"
+            # latest measurement for the patient, served by the (patient_id, created_at) index
+            query = "SELECT * FROM parkinsons_data_1 WHERE patient_id = ? ORDER BY created_at DESC, id DESC LIMIT 1"
             c.execute(query, (patient_id,))
             parkinsons_data = c.fetchone()
             return parkinsons_data
-        except sqlite3.Error as e:
-            print(f"Error: {e}")
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return None
+
+@timed(DB_SECONDS)
+def insert_predictions(rows):
+    # rows: (patient_id, disease, model_version, measurement_id, prediction, risk_score, risk_category[, suggestion])
+    # One row per (patient, disease, model version, measurement); re-scoring the same inputs overwrites it,
+    # and a row stored without a suggestion keeps the one already there.
+    try:
+        with get_connection() as connection:
+            now = datetime.now()
+            query = '''INSERT INTO predictions (patient_id, disease, model_version, measurement_id, prediction, risk_score, risk_category, suggestion, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (patient_id, disease, model_version, measurement_id) DO UPDATE SET
+                           prediction = excluded.prediction,
+                           risk_score = excluded.risk_score,
+                           risk_category = excluded.risk_category,
+                           suggestion = COALESCE(excluded.suggestion, predictions.suggestion),
+                           created_at = excluded.created_at'''
+            connection.executemany(query, [tuple(row[:8]) + (None,) * (8 - len(row)) + (now,) for row in rows])
+            connection.commit()
+            return True
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return False
+
+@timed(DB_SECONDS)
+def retrieve_stored_predictions(patient_id, keys):
+    # keys: {disease: (model_version, measurement_id)} -> {disease: row dict} for the ones already stored
+    if not keys:
+        return {}
+    conditions = ' OR '.join("(disease = ? AND model_version = ? AND measurement_id = ?)" for _ in keys)
+    params = [patient_id]
+    for disease, (model_version, measurement_id) in keys.items():
+        params += [disease, model_version, measurement_id]
+    try:
+        with get_connection() as connection:
+            cursor = connection.execute(f'''SELECT disease, model_version, measurement_id, prediction, risk_score, risk_category, suggestion, created_at
+                                            FROM predictions WHERE patient_id = ? AND ({conditions})''', params)
+            names = [description[0] for description in cursor.description]
+            return {row[0]: dict(zip(names, row)) for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return {}
+
+class PatientSnapshot(NamedTuple):
+    # Column-named view of a patient and their latest measurement per disease (None if never measured)
+    patient: dict
+    diabetes: Optional[dict]
+    heart_disease: Optional[dict]
+    parkinsons: Optional[dict]
+
+    def measurement(self, disease):
+        return getattr(self, disease)
+
+    def missing(self):
+        return [disease for disease in DISEASE_FEATURES if self.measurement(disease) is None]
+
+    def features(self, disease):
+        # Model input in training order, or None if the patient has no measurement for this disease.
+        # A NULL column (e.g. the age of a bulk-imported Parkinson's patient) is NaN, for the model's imputer.
+        measurement = self.measurement(disease)
+        if measurement is None:
             return None
+        values = [self.patient[name] if name in PATIENT_FEATURES else measurement[name] for name in DISEASE_FEATURES[disease][1]]
+        return [float('nan') if value is None else float(value) for value in values]
+
+def _snapshot_query():
+    columns = ["p.id AS patient__id", "p.name AS patient__name", "p.age AS patient__age", "p.gender AS patient__gender",
+               f"{PATIENT_FEATURES['sex']} AS patient__sex"]
+    joins = []
+    for disease, (table, features) in DISEASE_FEATURES.items():
+        measured = ['id', 'created_at'] + [name for name in features if name not in PATIENT_FEATURES]
+        columns += [f"{disease}.{name} AS {disease}__{name}" for name in measured]
+        # correlated LIMIT 1 lookups are index seeks on (patient_id, created_at)
+        joins.append(f"""LEFT JOIN {table} {disease} ON {disease}.id = (
+                        SELECT id FROM {table} WHERE patient_id = p.id ORDER BY created_at DESC, id DESC LIMIT 1)""")
+    return f"SELECT {', '.join(columns)} FROM patients p {' '.join(joins)} WHERE p.id = ?"
+
+SNAPSHOT_QUERY = _snapshot_query()
+
+def read_patient_snapshot(connection, patient_id):
+    cursor = connection.execute(SNAPSHOT_QUERY, (patient_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    groups = {}
+    for description, value in zip(cursor.description, row):
+        group, name = description[0].split('__', 1)
+        groups.setdefault(group, {})[name] = value
+    measurements = {disease: groups[disease] if groups[disease]['id'] is not None else None
+                    for disease in DISEASE_FEATURES}
+    return PatientSnapshot(groups['patient'], **measurements)
+
+@timed(DB_SECONDS)
+def get_patient_feature_snapshot(patient_id):
+    # Patient row plus the latest diabetes, heart disease and Parkinson's measurements in one round trip
+    try:
+        with get_connection() as connection:
+            return read_patient_snapshot(connection, patient_id)
+    except sqlite3.Error as e:
+        print(f"Error: {e}")
+        return None
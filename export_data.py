@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import create_db
+
+# export name -> table
+EXPORT_TABLES = {
+    'patients': 'patients',
+    'diabetes': 'diabetes_data',
+    'heart_disease': 'heart_disease_data',
+    'parkinsons': 'parkinsons_data_1',
+    'predictions': 'predictions',
+}
+
+# export name -> column an incremental export resumes from. Rows are only ever appended to the
+# patient and measurement tables, and SQLite hands out ids in commit order, so `id > last id` misses
+# nothing; created_at is set by the app before its transaction commits and can land behind the watermark.
+# predictions are upserted in place (same id, new created_at), so they resume from created_at.
+INCREMENTAL_COLUMNS = {
+    'patients': 'id',
+    'diabetes': 'id',
+    'heart_disease': 'id',
+    'parkinsons': 'id',
+    'predictions': 'created_at',
+}
+# created_at watermarks re-read this many seconds before the last one, for rows committed late;
+# the overlap is exported again and deduplicates on the predictions key, keeping the newest created_at
+SAFETY_WINDOW = float(os.environ.get('HPX_EXPORT_SAFETY_WINDOW', '300'))
+
+SQLITE_TO_ARROW = {'INTEGER': pa.int64(), 'REAL': pa.float64(), 'TEXT': pa.string()}
+
+
+def table_schema(connection, table):
+    columns = [(row[1], row[2].upper()) for row in connection.execute(f"PRAGMA table_info({table})")]
+    if not columns:
+        raise ValueError(f"Table {table} does not exist")
+    return pa.schema([(name, SQLITE_TO_ARROW.get(declared, pa.string())) for name, declared in columns])
+
+
+def _coerce(value, type):
+    if value is None:
+        return None
+    try:
+        if pa.types.is_integer(type):
+            return int(value)
+        if pa.types.is_floating(type):
+            return float(value)
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _column_array(values, type):
+    try:
+        return pa.array(values, type=type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        # SQLite doesn't enforce column types (e.g. text typed into a numeric form field)
+        return pa.array([_coerce(value, type) for value in values], type=type)
+
+
+def iter_record_batches(connection, table, schema, batch_size, since=None, since_column='created_at'):
+    # Streams rows as Arrow record batches; only one batch is held in memory at a time
+    query = f"SELECT * FROM {table}"
+    params = ()
+    if since is not None:
+        query += f" WHERE {since_column} > ?"
+        params = (since,)
+    # rowid order streams straight off the table; ordering by created_at would need a full sort first
+    query += " ORDER BY id"
+    cursor = connection.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays([_column_array(list(values), field.type) for values, field in zip(columns, schema)],
+                                         schema=schema)
+
+
+class _ArrowFileWriter:
+    def __init__(self, path, schema):
+        self._sink = pa.OSFile(path, 'wb')
+        self._writer = ipc.new_file(self._sink, schema)
+
+    def write_batch(self, batch):
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        self._sink.close()
+
+
+class _ParquetFileWriter:
+    def __init__(self, path, schema):
+        self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+
+    def write_batch(self, batch):
+        # each batch becomes its own row group, so memory stays bounded by batch_size
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {'parquet': _ParquetFileWriter, 'arrow': _ArrowFileWriter}
+
+
+def load_state(path):
+    if path and os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    return {}
+
+
+def save_state(path, state):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _resume_from(connection, name, watermark):
+    # the value to export rows after, from a saved watermark ({'column', 'value'}, or a bare created_at
+    # string from before ids were tracked)
+    column = INCREMENTAL_COLUMNS[name]
+    if watermark is None:
+        return None
+    if isinstance(watermark, str):
+        watermark = {'column': 'created_at', 'value': watermark}
+    if watermark['column'] == column == 'created_at':
+        return str(datetime.fromisoformat(watermark['value']) - timedelta(seconds=SAFETY_WINDOW))
+    if watermark['column'] == column:
+        return watermark['value']
+    # an old created_at watermark on an id table: carry on after the rows it covered
+    return connection.execute(f"SELECT COALESCE(MAX(id), 0) FROM {EXPORT_TABLES[name]} WHERE created_at <= ?",
+                              (watermark['value'],)).fetchone()[0]
+
+
+def export_table(connection, name, out_dir, format='parquet', batch_size=10000, since=None):
+    # since: value of INCREMENTAL_COLUMNS[name] to export rows after.
+    # Returns (file written or None, rows, newest value of that column seen)
+    table = EXPORT_TABLES[name]
+    since_column = INCREMENTAL_COLUMNS[name]
+    schema = table_schema(connection, table)
+    os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+    path = os.path.join(out_dir, name, f"{name}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}.{format}")
+    since_index = schema.get_field_index(since_column)
+
+    writer = None
+    rows = 0
+    watermark = since
+    try:
+        for batch in iter_record_batches(connection, table, schema, batch_size, since, since_column):
+            if writer is None:
+                writer = WRITERS[format](path, schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            if since_index >= 0:
+                newest = pc.max(batch.column(since_index)).as_py()
+                if newest is not None and (watermark is None or newest > watermark):
+                    watermark = newest
+    finally:
+        if writer is not None:
+            writer.close()
+    return (path if writer is not None else None), rows, watermark
+
+
+def export(names=None, out_dir='exports', format='parquet', batch_size=10000, incremental=False, state_path=None):
+    names = names or list(EXPORT_TABLES)
+    state_path = state_path or os.path.join(out_dir, 'export_state.json')
+    # a full export also moves the watermarks, so the next incremental run starts from it
+    state = load_state(state_path)
+    os.makedirs(out_dir, exist_ok=True)
+    results = {}
+    # a dedicated connection: a long streaming read shouldn't tie up one of the app's pooled connections
+    connection = create_db.create_connection()
+    try:
+        for name in names:
+            start = time.perf_counter()
+            since = _resume_from(connection, name, state.get(name)) if incremental else None
+            path, rows, watermark = export_table(connection, name, out_dir, format, batch_size, since)
+            # the window is applied when resuming, so a re-read that finds nothing newer keeps the old watermark
+            if watermark is not None and watermark != since:
+                state[name] = {'column': INCREMENTAL_COLUMNS[name], 'value': watermark}
+            results[name] = {'path': path, 'rows': rows, 'seconds': time.perf_counter() - start}
+    finally:
+        connection.close()
+    save_state(state_path, state)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export patients, measurements and predictions to Parquet or Arrow IPC files.')
+    parser.add_argument('tables', nargs='*', help=f"Any of {', '.join(EXPORT_TABLES)} (default: all)")
+    parser.add_argument('--out', default='exports', help='Output directory (one sub-directory per table)')
+    parser.add_argument('--format', choices=list(WRITERS), default='parquet')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--incremental', action='store_true', help='Only rows added since the last export run (predictions: also updated ones, '
+                             'plus a re-read overlap of HPX_EXPORT_SAFETY_WINDOW seconds)')
+    parser.add_argument('--state', help='Watermark file (default: <out>/export_state.json)')
+    args = parser.parse_args()
+    unknown = [name for name in args.tables if name not in EXPORT_TABLES]
+    if unknown:
+        parser.error(f"unknown table(s): {', '.join(unknown)}")
+
+    results = export(args.tables or None, args.out, args.format, args.batch_size, args.incremental, args.state)
+    for name, result in results.items():
+        target = result['path'] or 'nothing new'
+        print(f"{name}: {result['rows']} rows -> {target} ({result['seconds']:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
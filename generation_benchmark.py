@@ -0,0 +1,138 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+# Parity and speed check for the text-generation backends (text_generation.BACKENDS).
+# Each backend runs in its own process so peak RSS isn't shared; greedy outputs for the
+# suggestion prompts are compared token by token with the fp32 torch reference.
+
+# minimum mean agreement with the reference for each backend to pass
+PARITY_THRESHOLDS = {'torch': 1.0, 'onnx': 0.99, 'int8': 0.6}
+
+
+def suggestion_prompts():
+    from health_suggestions import DISEASES, RISK_LEVELS, build_suggestion_prompt
+
+    return [build_suggestion_prompt(prediction, risk_level, disease)
+            for disease in DISEASES for prediction in (0, 1) for risk_level in RISK_LEVELS]
+
+
+def _rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_backend(backend, model_name, prompts, max_new_tokens, repeats):
+    import torch
+    from text_generation import TextGenerator
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    generator = TextGenerator(model_name, backend=backend)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+
+    tokenizer = generator.tokenizer
+    outputs = []
+    new_tokens = 0
+    latencies = []
+    for _ in range(repeats):
+        outputs = []
+        for prompt in prompts:
+            inputs = tokenizer(prompt, return_tensors='pt')
+            start = time.perf_counter()
+            with torch.inference_mode():
+                output_ids = generator.model.generate(**inputs, max_new_tokens=max_new_tokens, min_new_tokens=max_new_tokens,
+                                                      do_sample=False, pad_token_id=tokenizer.pad_token_id)
+            latencies.append(time.perf_counter() - start)
+            generated = output_ids[0, inputs['input_ids'].shape[1]:].tolist()
+            new_tokens += len(generated)
+            outputs.append(generated)
+    return {
+        'backend': backend,
+        'load_seconds': load_seconds,
+        'tokens_per_second': new_tokens / sum(latencies),
+        'latency_p50_ms': sorted(latencies)[len(latencies) // 2] * 1000,
+        'rss_model_mb': rss_loaded - rss_before,
+        'rss_peak_mb': _rss_mb(),
+        'token_ids': outputs,
+    }
+
+
+def agreement(reference, candidate):
+    # share of generated tokens that match the reference before the first divergence
+    matched = 0
+    for expected, actual in zip(reference, candidate):
+        if expected != actual:
+            break
+        matched += 1
+    return matched / max(len(reference), 1)
+
+
+def compare(reference, result):
+    scores = [agreement(expected, actual) for expected, actual in zip(reference, result['token_ids'])]
+    return {
+        'exact_match': sum(score == 1.0 for score in scores) / len(scores),
+        'mean_agreement': sum(scores) / len(scores),
+    }
+
+
+def benchmark(backends, model_name, max_new_tokens=40, repeats=1, reference_path=None, save_reference=None):
+    prompts = suggestion_prompts()
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        # fresh process per backend: torch, onnxruntime and the model weights all count towards RSS
+        for backend in backends:
+            results[backend] = pool.apply(run_backend, (backend, model_name, prompts, max_new_tokens, repeats))
+        if reference_path:
+            with open(reference_path) as file:
+                reference = json.load(file)['token_ids']
+        else:
+            if 'torch' not in results:
+                results['torch'] = pool.apply(run_backend, ('torch', model_name, prompts, max_new_tokens, repeats))
+            reference = results['torch']['token_ids']
+    if save_reference:
+        with open(save_reference, 'w') as file:
+            json.dump({'model': model_name, 'max_new_tokens': max_new_tokens, 'prompts': prompts, 'token_ids': reference}, file)
+    for result in results.values():
+        result.update(compare(reference, result))
+    return results
+
+
+def main():
+    from text_generation import BACKENDS, MODEL_NAME
+
+    parser = argparse.ArgumentParser(description='Compare text-generation backends: parity with fp32 torch, tokens/sec and RSS.')
+    parser.add_argument('backends', nargs='*', default=list(BACKENDS), help=f"Any of {', '.join(BACKENDS)} (default: all)")
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--max-new-tokens', type=int, default=40)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--reference', help='Reference token ids saved by --save-reference (default: run torch now)')
+    parser.add_argument('--save-reference', help='Write the reference token ids to this JSON file')
+    parser.add_argument('--json', action='store_true', help='Print the full results as JSON')
+    args = parser.parse_args()
+    unknown = [backend for backend in args.backends if backend not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown backend(s): {', '.join(unknown)}")
+
+    results = benchmark(args.backends, args.model, args.max_new_tokens, args.repeats, args.reference, args.save_reference)
+    failed = [backend for backend, result in results.items() if result['mean_agreement'] < PARITY_THRESHOLDS[backend]]
+    if args.json:
+        print(json.dumps({backend: {key: value for key, value in result.items() if key != 'token_ids'}
+                          for backend, result in results.items()}, indent=2))
+    else:
+        for backend, result in results.items():
+            print(f"{backend:6} {result['tokens_per_second']:8.1f} tokens/s  p50 {result['latency_p50_ms']:7.1f} ms  "
+                  f"model {result['rss_model_mb']:7.1f} MB  peak RSS {result['rss_peak_mb']:7.1f} MB  "
+                  f"parity {result['mean_agreement']:.3f} (exact {result['exact_match']:.0%})"
+                  f"{'  FAILED' if backend in failed else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import GENERATION_SECONDS, SUGGESTION_SECONDS, span, timed
+from text_generation import get_text_generator
+
+DISEASES = ['Diabetes', 'Heart Disease', 'Parkinsons']
+RISK_LEVELS = ['Low Risk', 'Medium Risk', 'High Risk']
+
+# The prompt only depends on (disease, prediction, risk level), so there are 18 possible suggestions
+SUGGESTION_CACHE_PATH = os.environ.get('HPX_SUGGESTION_CACHE', 'suggestion_cache.sqlite')
+SUGGESTION_CACHE_SIZE = int(os.environ.get('HPX_SUGGESTION_CACHE_SIZE', '64'))
+# Greedy decoding makes a cached suggestion identical to a freshly generated one
+DETERMINISTIC = os.environ.get('HPX_SUGGESTION_DETERMINISTIC', '1') == '1'
+
+
+def build_suggestion_prompt(prediction, risk_level, disease):
+    return (f"The patient's prediction for {disease} is {'positive' if prediction==1 else 'negative'} and their risk level is {risk_level}. "
+            "Based on this, provide a recommendation on whether further testing is required.")
+
+
+def postprocess_suggestion(prompt, generated_text):
+    response_start = prompt.split('recommendation regarding further testing?')[0]
+    response = generated_text.replace(response_start, '').strip()
+
+    # Post-process to ensure it's concise and returns only the first two sentences
+    sentences = response.split('. ')
+    result = '. '.join(sentences[:2]).strip()
+
+    return result if result.endswith('.') else result + '.'
+
+
+class SuggestionCache:
+    # Bounded LRU kept in memory and mirrored to SQLite so it survives restarts. Reads only touch
+    # memory; their last_used times are written in one batch on the next put and on close().
+
+    def __init__(self, path=SUGGESTION_CACHE_PATH, max_entries=SUGGESTION_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # cache_key -> last_used of entries read since the last flush
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._connection = None
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            with self._connection:
+                self._connection.execute('''CREATE TABLE IF NOT EXISTS suggestion_cache (
+                                            cache_key TEXT PRIMARY KEY,
+                                            suggestion TEXT NOT NULL,
+                                            last_used REAL
+                                          );''')
+            rows = self._connection.execute(
+                "SELECT cache_key, suggestion FROM suggestion_cache ORDER BY last_used DESC LIMIT ?",
+                (self.max_entries,)).fetchall()
+            # oldest first so the most recently used entry ends up at the MRU end
+            for cache_key, suggestion in reversed(rows):
+                self._entries[cache_key] = suggestion
+
+    @staticmethod
+    def make_key(prediction, risk_level, disease, variant=''):
+        return f"{disease}|{int(prediction)}|{risk_level}|{variant}"
+
+    def get(self, cache_key):
+        with self._lock:
+            if cache_key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            if self._connection is not None:
+                self._touched[cache_key] = time.time()
+            return self._entries[cache_key]
+
+    def _flush(self, upserts=(), evicted=()):
+        # caller holds self._lock; one transaction for the pending last_used updates and this put
+        touched = [(last_used, key) for key, last_used in self._touched.items() if key not in evicted]
+        self._touched.clear()
+        with self._connection:
+            self._connection.executemany("UPDATE suggestion_cache SET last_used = ? WHERE cache_key = ?", touched)
+            self._connection.executemany("INSERT OR REPLACE INTO suggestion_cache (cache_key, suggestion, last_used) VALUES (?, ?, ?)",
+                                         upserts)
+            self._connection.executemany("DELETE FROM suggestion_cache WHERE cache_key = ?", [(key,) for key in evicted])
+
+    def put(self, cache_key, suggestion):
+        with self._lock:
+            self._entries[cache_key] = suggestion
+            self._entries.move_to_end(cache_key)
+            self._touched.pop(cache_key, None)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._connection is not None:
+                self._flush([(cache_key, suggestion, time.time())], evicted)
+
+    def __contains__(self, cache_key):
+        return cache_key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._touched.clear()
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute("DELETE FROM suggestion_cache")
+
+    def close(self):
+        # writes the pending last_used times; the cache keeps working in memory afterwards
+        with self._lock:
+            if self._connection is None:
+                return
+            try:
+                self._flush()
+            finally:
+                self._connection.close()
+                self._connection = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_suggestion_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SuggestionCache()
+                atexit.register(_cache.close)
+    return _cache
+
+
+def _cache_variant(generator, deterministic):
+    # Different models or decoding modes must not share cache entries
+    name = getattr(generator, 'model_name', type(generator).__name__)
+    backend = getattr(generator, 'backend', 'torch')
+    if backend != 'torch':
+        # quantized / ONNX outputs differ slightly from fp32 torch
+        name += f"+{backend}"
+    return f"{name}:{'greedy' if deterministic else 'sampled'}"
+
+
+def get_ai_health_suggestions(prediction, risk_level, disease, generator=None, cache=None, deterministic=DETERMINISTIC):
+    return get_ai_health_suggestions_batch([(prediction, risk_level, disease)], generator, cache, deterministic)[0]
+
+
+@timed(SUGGESTION_SECONDS)
+def get_ai_health_suggestions_batch(requests, generator=None, cache=None, deterministic=DETERMINISTIC):
+    # requests: [(prediction, risk_level, disease), ...] -> one suggestion per request, same order.
+    # Cache hits skip the model entirely; all misses are generated together in one padded batch.
+    if not requests:
+        return []
+    generator = generator or get_text_generator()
+    cache = cache if cache is not None else get_suggestion_cache()
+    variant = _cache_variant(generator, deterministic)
+
+    keys = [SuggestionCache.make_key(prediction, risk_level, disease, variant) for prediction, risk_level, disease in requests]
+    results = [cache.get(key) for key in keys]
+
+    missing = {}
+    for index, key in enumerate(keys):
+        if results[index] is None:
+            missing.setdefault(key, []).append(index)
+
+    if missing:
+        pending = [requests[indexes[0]] for indexes in missing.values()]
+        prompts = [build_suggestion_prompt(prediction, risk_level, disease) for prediction, risk_level, disease in pending]
+        with span(GENERATION_SECONDS):
+            outputs = generator.generate_batch(prompts, num_return_sequences=1, do_sample=not deterministic)
+        for (key, indexes), prompt, texts in zip(missing.items(), prompts, outputs):
+            suggestion = postprocess_suggestion(prompt, texts[0])
+            cache.put(key, suggestion)
+            for index in indexes:
+                results[index] = suggestion
+
+    return results
+
+
+def warm_suggestion_cache(generator=None, cache=None, deterministic=DETERMINISTIC):
+    # Pre-generate every (disease, prediction, risk level) combination that is not cached yet
+    requests = [(prediction, risk_level, disease)
+                for disease in DISEASES for prediction in (0, 1) for risk_level in RISK_LEVELS]
+    return get_ai_health_suggestions_batch(requests, generator, cache, deterministic)
@@ -0,0 +1,255 @@
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from create_db import get_connection
+
+# Prediction jobs: the UI submits a patient ID and polls; worker processes claim queued jobs from the
+# prediction_jobs table and run scoring + suggestion generation. The number of workers bounds how many
+# GPT-2 generations run at once, instead of every Streamlit session generating on its own thread.
+NUM_WORKERS = int(os.environ.get('HPX_JOB_WORKERS', '1'))
+POLL_INTERVAL = float(os.environ.get('HPX_JOB_POLL_INTERVAL', '0.5'))
+# a job still 'running' after this long belongs to a worker that died; it is queued again
+STALE_AFTER = float(os.environ.get('HPX_JOB_STALE_AFTER', '600'))
+# how often each worker looks for such jobs while it runs
+REQUEUE_INTERVAL = float(os.environ.get('HPX_JOB_REQUEUE_INTERVAL', '60'))
+# the UI gives up on a job this long after it was submitted
+JOB_TIMEOUT = float(os.environ.get('HPX_JOB_TIMEOUT', '300'))
+MAX_ATTEMPTS = 3
+
+FINISHED = ('done', 'failed')
+
+
+def submit_job(patient_id):
+    with get_connection() as connection:
+        cursor = connection.execute("INSERT INTO prediction_jobs (patient_id, status, created_at) VALUES (?, 'queued', ?)",
+                                    (patient_id, str(datetime.now())))
+        return cursor.lastrowid
+
+
+def _seconds_between(start, end):
+    # timestamps are stored as str(datetime); None until the job gets that far
+    if start is None or end is None:
+        return None
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+def get_job(job_id):
+    with get_connection() as connection:
+        cursor = connection.execute('''SELECT id, patient_id, status, result, error, worker, attempts, created_at, started_at, finished_at
+                                       FROM prediction_jobs WHERE id = ?''', (job_id,))
+        columns = [column[0] for column in cursor.description]
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip(columns, row))
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['queue_seconds'] = _seconds_between(job['created_at'], job['started_at'])
+    job['run_seconds'] = _seconds_between(job['started_at'], job['finished_at'])
+    return job
+
+
+def job_timed_out(job, timeout=JOB_TIMEOUT):
+    # unfinished and submitted more than timeout seconds ago (e.g. no worker is running)
+    return job['status'] not in FINISHED and _seconds_between(job['created_at'], str(datetime.now())) > timeout
+
+
+def queue_depth():
+    with get_connection() as connection:
+        counts = dict(connection.execute("SELECT status, COUNT(*) FROM prediction_jobs GROUP BY status").fetchall())
+    return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+
+def claim_job(worker):
+    # The UPDATE takes SQLite's write lock before the subquery runs, so two workers can never claim the same job
+    with get_connection() as connection:
+        row = connection.execute('''UPDATE prediction_jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1
+                                    WHERE id = (SELECT id FROM prediction_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                                    RETURNING id, patient_id''', (worker, str(datetime.now()))).fetchone()
+    return row
+
+
+def finish_job(job_id, result=None, error=None):
+    with get_connection() as connection:
+        connection.execute("UPDATE prediction_jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                           ('failed' if error else 'done', None if result is None else json.dumps(result), error,
+                            str(datetime.now()), job_id))
+
+
+def requeue_stale_jobs(stale_after=STALE_AFTER):
+    cutoff = str(datetime.now() - timedelta(seconds=stale_after))
+    with get_connection() as connection:
+        connection.execute('''UPDATE prediction_jobs SET status = 'failed', error = 'worker stopped responding', finished_at = ?
+                              WHERE status = 'running' AND started_at < ? AND attempts >= ?''',
+                           (str(datetime.now()), cutoff, MAX_ATTEMPTS))
+        cursor = connection.execute('''UPDATE prediction_jobs SET status = 'queued', worker = NULL
+                                       WHERE status = 'running' AND started_at < ?''', (cutoff,))
+        return cursor.rowcount
+
+
+def run_job(job_id, patient_id, generator=None, registry=None):
+    from metrics import request_trace
+    from prediction_service import predict_patient, prediction_result
+
+    try:
+        with request_trace() as trace:
+            result = prediction_result(predict_patient(patient_id, generator, registry))
+    except Exception as e:
+        finish_job(job_id, error=f"{type(e).__name__}: {e}")
+        return False
+    if trace:
+        # the worker's timings travel with the result, for the UI breakdown and the app's /metrics
+        result['trace'] = trace
+    finish_job(job_id, result)
+    return True
+
+
+def run_worker(name=None, stop_event=None, poll_interval=POLL_INTERVAL, max_jobs=None):
+    # Claims and runs jobs until stop_event is set (or max_jobs have run). Models and the text
+    # generator are loaded once per worker process.
+    from model_registry import get_registry
+    from text_generation import get_text_generator
+
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    registry = get_registry()
+    generator = get_text_generator()
+    done = 0
+    last_requeue = None
+    while not (stop_event is not None and stop_event.is_set()) and (max_jobs is None or done < max_jobs):
+        # jobs of a worker that died mid-run are picked up again without waiting for a restart
+        if last_requeue is None or time.monotonic() - last_requeue >= REQUEUE_INTERVAL:
+            requeue_stale_jobs()
+            last_requeue = time.monotonic()
+        job = claim_job(name)
+        if job is None:
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        run_job(job[0], job[1], generator, registry)
+        done += 1
+    return done
+
+
+def _worker_main(name, stop_event, poll_interval, num_threads):
+    # runs in a spawned process, before torch is imported: split the cores between the workers
+    if num_threads and 'HPX_TORCH_THREADS' not in os.environ:
+        os.environ['HPX_TORCH_THREADS'] = str(num_threads)
+    try:
+        run_worker(name, stop_event, poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class WorkerPool:
+    # Fixed set of worker processes. 'spawn' so children don't inherit the parent's SQLite
+    # connections or torch thread pools.
+
+    def __init__(self, num_workers=NUM_WORKERS, poll_interval=POLL_INTERVAL):
+        self.num_workers = max(1, num_workers)
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._processes = []
+        self.restarts = 0
+
+    def _spawn(self, i):
+        num_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        process = self._context.Process(target=_worker_main, name=f"prediction-worker-{i}", daemon=True,
+                                        args=(f"{socket.gethostname()}:worker-{i}", self._stop, self.poll_interval, num_threads))
+        process.start()
+        return process
+
+    def start(self):
+        self._processes = [self._spawn(i) for i in range(self.num_workers)]
+        return self
+
+    def alive(self):
+        return sum(process.is_alive() for process in self._processes)
+
+    def ensure(self):
+        # Replaces workers that died (crash, OOM kill); their running job is requeued once it goes stale
+        if self._stop.is_set():
+            return self
+        for i, process in enumerate(self._processes):
+            if not process.is_alive():
+                process.join(0)
+                self._processes[i] = self._spawn(i)
+                self.restarts += 1
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    # One pool per server process, shared by every Streamlit session; each call restarts dead workers
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool().start()
+            atexit.register(_pool.stop)
+        else:
+            _pool.ensure()
+    return _pool
+
+
+def wait_for_job(job_id, timeout=None, poll_interval=POLL_INTERVAL):
+    start = time.perf_counter()
+    while True:
+        job = get_job(job_id)
+        if job is None or job['status'] in FINISHED or (timeout is not None and time.perf_counter() - start >= timeout):
+            return job
+        time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Background prediction jobs.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker_parser = commands.add_parser('worker', help='Run a pool of worker processes until interrupted')
+    worker_parser.add_argument('--workers', type=int, default=NUM_WORKERS)
+    submit_parser = commands.add_parser('submit', help='Queue a prediction for one or more patients')
+    submit_parser.add_argument('patient_ids', nargs='+', type=int)
+    submit_parser.add_argument('--wait', action='store_true', help='Wait for the jobs to finish and print the results')
+    status_parser = commands.add_parser('status', help='Show a job, or the queue depth')
+    status_parser.add_argument('job_id', nargs='?', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        pool = WorkerPool(args.workers).start()
+        print(f"{args.workers} worker(s) running; Ctrl+C to stop")
+        try:
+            while True:
+                pool.ensure()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.stop()
+    elif args.command == 'submit':
+        job_ids = [submit_job(patient_id) for patient_id in args.patient_ids]
+        for job_id in job_ids:
+            print(json.dumps(wait_for_job(job_id) if args.wait else {'id': job_id, 'status': 'queued'}, default=str))
+    elif args.job_id is None:
+        print(json.dumps(queue_depth()))
+    else:
+        print(json.dumps(get_job(args.job_id), default=str))
+
+
+if __name__ == '__main__':
+    main()
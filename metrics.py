@@ -0,0 +1,215 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process latency histograms for the hot paths (database calls, model scoring, suggestion
+# generation, PDF rendering), rendered in the Prometheus text format. Off unless HPX_METRICS=1:
+# timed() then hands back the undecorated function and span() a shared no-op context manager.
+ENABLED = os.environ.get('HPX_METRICS', '0') == '1'
+# port for the Streamlit process's own /metrics endpoint (api.py serves /metrics itself)
+PORT = os.environ.get('HPX_METRICS_PORT')
+HOST = os.environ.get('HPX_METRICS_HOST', '127.0.0.1')
+
+# upper bounds in seconds, from a SQLite point lookup up to a long GPT-2 generation
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DB_SECONDS = 'hpx_db_seconds'
+SCORE_SECONDS = 'hpx_model_score_seconds'
+SUGGESTION_SECONDS = 'hpx_suggestion_seconds'
+GENERATION_SECONDS = 'hpx_generation_seconds'
+PDF_SECONDS = 'hpx_pdf_seconds'
+PREDICTION_SECONDS = 'hpx_prediction_seconds'
+TTFT_SECONDS = 'hpx_ttft_seconds'
+
+DESCRIPTIONS = {
+    DB_SECONDS: 'create_db retrieve/insert calls',
+    SCORE_SECONDS: 'predict_proba batches per disease model',
+    SUGGESTION_SECONDS: 'Suggestion lookups, cache hits and generation together',
+    GENERATION_SECONDS: 'Text model generate_batch calls (suggestion cache misses)',
+    PDF_SECONDS: 'Medical report PDF rendering',
+    PREDICTION_SECONDS: 'Whole patient predictions: snapshot, scoring, suggestions and storing',
+    TTFT_SECONDS: 'Time to first token of streamed chatbot replies',
+}
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # counts[i]: observations in (buckets[i-1], buckets[i]]; the last one is above every bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+# (metric, sorted label pairs) -> Histogram
+_histograms = {}
+_lock = threading.Lock()
+# spans finished inside request_trace() are also appended here
+_trace = contextvars.ContextVar('hpx_trace', default=None)
+
+
+def observe(metric, seconds, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Span:
+    __slots__ = ('metric', 'labels', 'start')
+
+    def __init__(self, metric, labels):
+        self.metric = metric
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        observe(self.metric, seconds, **self.labels)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append({'metric': self.metric, 'labels': self.labels, 'start': self.start, 'seconds': seconds})
+        return False
+
+
+_NOOP = nullcontext()
+
+
+def span(metric, **labels):
+    # with span(SCORE_SECONDS, disease='diabetes'): ...
+    if not ENABLED:
+        return _NOOP
+    return _Span(metric, labels)
+
+
+def timed(metric, **labels):
+    # Decorator version of span(), labelled with the function name. Decided at import time, so a
+    # disabled process runs the original function with no wrapper at all.
+    def decorate(function):
+        if not ENABLED:
+            return function
+        function_labels = {'function': function.__name__, **labels}
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Span(metric, function_labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def request_trace():
+    # Collects the spans finished inside the block (same thread or asyncio task) for a per-request
+    # breakdown: [{'metric', 'labels', 'start', 'seconds'}, ...] with start relative to the block
+    spans = []
+    if not ENABLED:
+        yield spans
+        return
+    token = _trace.set(spans)
+    start = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+        for item in spans:
+            item['start'] -= start
+
+
+def record_trace(spans):
+    # Adds spans traced in another process (e.g. a job worker) to this process's histograms
+    for item in spans:
+        observe(item['metric'], item['seconds'], **item['labels'])
+
+
+def breakdown(spans):
+    # request_trace() spans as table rows in start order; nested steps (generation inside
+    # suggestions inside the prediction) follow the step that contains them
+    rows = []
+    for item in sorted(spans, key=lambda item: (item['start'], -item['seconds'])):
+        name = item['metric'].removeprefix('hpx_').removesuffix('_seconds')
+        details = ', '.join(str(value) for value in item['labels'].values())
+        rows.append({'step': f"{name} ({details})" if details else name, 'start_ms': round(item['start'] * 1000, 2),
+                     'duration_ms': round(item['seconds'] * 1000, 2)})
+    return rows
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+def render():
+    # Prometheus text exposition format (version 0.0.4)
+    with _lock:
+        histograms = sorted((key, list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                            for key, histogram in _histograms.items())
+    lines = []
+    current = None
+    for (metric, pairs), counts, total, count, buckets in histograms:
+        if metric != current:
+            current = metric
+            lines.append(f"# HELP {metric} {DESCRIPTIONS.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip([*map(repr, buckets), '+Inf'], counts):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_labels(pairs + (('le', bound),))} {cumulative}")
+        lines.append(f"{metric}_sum{_labels(pairs)} {total!r}")
+        lines.append(f"{metric}_count{_labels(pairs)} {count}")
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host=HOST):
+    # /metrics on a background thread; returns the server (server.shutdown() stops it)
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='hpx-metrics', daemon=True).start()
+    return server
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_metrics_server():
+    # One endpoint per server process, shared by every Streamlit session; None unless enabled with a port
+    global _server
+    if _server is None and ENABLED and PORT:
+        with _server_lock:
+            if _server is None:
+                _server = serve(PORT)
+    return _server
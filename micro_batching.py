@@ -0,0 +1,188 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# Concurrent single-row requests are collected for up to MAX_WAIT_MS or MAX_BATCH_SIZE items and
+# answered by one vectorized call, so throughput grows with concurrency instead of each caller
+# paying for its own predict_proba / generate() pass.
+MODEL_MAX_WAIT_MS = float(os.environ.get('HPX_BATCH_MAX_WAIT_MS', '5'))
+MODEL_MAX_BATCH_SIZE = int(os.environ.get('HPX_BATCH_MAX_SIZE', '64'))
+# generation is far more expensive per call, so it is worth waiting a little longer for batch-mates
+GENERATION_MAX_WAIT_MS = float(os.environ.get('HPX_GEN_BATCH_MAX_WAIT_MS', '20'))
+GENERATION_MAX_BATCH_SIZE = int(os.environ.get('HPX_GEN_BATCH_MAX_SIZE', '8'))
+
+
+class MicroBatcher:
+    # handler(items) -> one result per item, same order. Callers get a Future per item.
+
+    def __init__(self, handler, max_batch_size=MODEL_MAX_BATCH_SIZE, max_wait_ms=MODEL_MAX_WAIT_MS, name='batcher'):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_depth = 0
+        self._batch_sizes = deque(maxlen=1000)
+        self._wait_seconds = deque(maxlen=1000)
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def map(self, items, timeout=None):
+        futures = [self.submit(item) for item in items]
+        return [future.result(timeout) for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            # skip callers that gave up (cancelled futures)
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self._handle([item for item, _, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # one bad item (e.g. a NaN row) shouldn't fail its batch-mates: retry each on its own
+                    for item, future, _ in batch:
+                        try:
+                            future.set_result(self._handle([item])[0])
+                        except Exception as item_error:
+                            future.set_exception(item_error)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._wait_seconds.extend(started - submitted for _, _, submitted in batch)
+
+    def _handle(self, items):
+        results = self.handler(items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name}: handler returned {len(results)} results for {len(items)} items")
+        return results
+
+    def stats(self):
+        with self._stats_lock:
+            sizes = list(self._batch_sizes)
+            waits = sorted(self._wait_seconds)
+            stats = {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_depth,
+                'batches': self._batches,
+                'items': self._items,
+                'mean_batch_size': sum(sizes) / len(sizes) if sizes else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+        if waits:
+            stats['queue_wait_p50_ms'] = waits[len(waits) // 2] * 1000
+            stats['queue_wait_p95_ms'] = waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000
+        return stats
+
+
+def _model_handler(disease, registry):
+    from scoring import score_batch
+
+    def handle(vectors):
+        # the entry is looked up per batch, so a hot-reloaded model is picked up by the next batch
+        entry = registry.get_entry(disease)
+        return [(entry.version, score) for score in score_batch(entry.model, vectors, disease)]
+    return handle
+
+
+class BatchingTextGenerator:
+    # Stands in for TextGenerator wherever generate_batch(prompts, ...) is called (e.g. the suggestion
+    # helpers): prompts from concurrent callers are merged into one padded generate() call.
+
+    def __init__(self, generator, max_batch_size=GENERATION_MAX_BATCH_SIZE, max_wait_ms=GENERATION_MAX_WAIT_MS):
+        self.generator = generator
+        self.model_name = getattr(generator, 'model_name', type(generator).__name__)
+        self.backend = getattr(generator, 'backend', 'torch')
+        self.batcher = MicroBatcher(self._handle, max_batch_size, max_wait_ms, name='generation')
+
+    def _handle(self, items):
+        # items: (prompt, do_sample); each decoding mode is generated as its own batch
+        results = [None] * len(items)
+        for do_sample in {do_sample for _, do_sample in items}:
+            indexes = [i for i, (_, sample) in enumerate(items) if sample == do_sample]
+            outputs = self.generator.generate_batch([items[i][0] for i in indexes], do_sample=do_sample)
+            for i, texts in zip(indexes, outputs):
+                results[i] = texts
+        return results
+
+    def generate_batch(self, prompts, max_length=None, num_return_sequences=1, temperature=None, do_sample=True, **kwargs):
+        if max_length is not None or num_return_sequences != 1 or temperature is not None or kwargs:
+            # non-default options can't share a batch with other callers
+            return self.generator.generate_batch(prompts, max_length, num_return_sequences, temperature, do_sample, **kwargs)
+        return self.batcher.map([(prompt, do_sample) for prompt in prompts])
+
+    def __call__(self, prompt, **kwargs):
+        return [{'generated_text': text} for text in self.generate_batch([prompt], **kwargs)[0]]
+
+    def stream(self, *args, **kwargs):
+        return self.generator.stream(*args, **kwargs)
+
+
+_model_batchers = {}
+_generation_batcher = None
+_batchers_lock = threading.Lock()
+
+
+def get_model_batcher(disease, registry=None):
+    # One batcher per disease per process; results are (model_version, Score)
+    if disease not in _model_batchers:
+        with _batchers_lock:
+            if disease not in _model_batchers:
+                from model_registry import get_registry
+                _model_batchers[disease] = MicroBatcher(_model_handler(disease, registry or get_registry()), name=disease)
+    return _model_batchers[disease]
+
+
+def get_batching_generator():
+    global _generation_batcher
+    if _generation_batcher is None:
+        with _batchers_lock:
+            if _generation_batcher is None:
+                from text_generation import get_text_generator
+                _generation_batcher = BatchingTextGenerator(get_text_generator())
+    return _generation_batcher
+
+
+def batcher_stats():
+    stats = {disease: batcher.stats() for disease, batcher in list(_model_batchers.items())}
+    if _generation_batcher is not None:
+        stats['generation'] = _generation_batcher.batcher.stats()
+    return stats
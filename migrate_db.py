@@ -0,0 +1,223 @@
+import argparse
+import sqlite3
+import create_db
+
+def create_tables(connection):
+    connection.execute('''CREATE TABLE IF NOT EXISTS patients (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT NOT NULL,
+                        age INTEGER,
+                        gender TEXT,
+                        address TEXT,
+                        phone_number TEXT,
+                        email TEXT,
+                        created_at TEXT
+                      );''')
+
+    
+    connection.execute('''CREATE TABLE IF NOT EXISTS diabetes_data (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        patient_id INTEGER,
+                        pregnancies INTEGER,
+                        glucose INTEGER,
+                        blood_pressure INTEGER,
+                        skin_thickness INTEGER,
+                        insulin INTEGER,
+                        bmi REAL,
+                        diabetes_pedigree REAL,
+                        created_at TEXT,
+                        FOREIGN KEY(patient_id) REFERENCES patients(id)
+                      );''')
+
+    connection.execute('''CREATE TABLE IF NOT EXISTS heart_disease_data (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        patient_id INTEGER,
+                        anaemia INTEGER CHECK (anaemia IN (0,1)),
+                        creatine INTEGER,
+                        diabetes INTEGER CHECK (diabetes IN (0,1)),
+                        ejection_fraction INTEGER,
+                        bp INTEGER CHECK (bp IN (0,1)),
+                        platelets INTEGER,
+                        serum_creatinine REAL,
+                        serum_sodium INTEGER,
+                        smoking INTEGER CHECK (smoking IN (0,1)),
+                        follow_up INTEGER,
+                        created_at TEXT,
+                        FOREIGN KEY(patient_id) REFERENCES patients(id)
+                      );''')
+
+    connection.execute('''CREATE TABLE IF NOT EXISTS parkinsons_data_1 (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        patient_id INTEGER,
+                        fo REAL,  -- MDVP:Fo(Hz)
+                        fhi REAL, -- MDVP:Fhi(Hz)
+                        flo REAL, -- MDVP:Flo(Hz)
+                        jitter_percent REAL, -- MDVP:Jitter(%)
+                        jitter_abs REAL, -- MDVP:Jitter(Abs)
+                        rap REAL, -- MDVP:RAP
+                        ppq REAL, -- MDVP:PPQ
+                        ddp REAL, -- Jitter:DDP
+                        shimmer REAL, -- MDVP:Shimmer
+                        shimmer_db REAL, -- MDVP:Shimmer(dB)
+                        apq3 REAL, -- Shimmer:APQ3
+                        apq5 REAL, -- Shimmer:APQ5
+                        apq REAL, -- MDVP:APQ
+                        dda REAL, -- Shimmer:DDA
+                        nhr REAL, -- NHR
+                        hnr REAL, -- HNR
+                        rpde REAL, -- RPDE
+                        dfa REAL, -- DFA
+                        spread1 REAL, -- spread1
+                        spread2 REAL, -- spread2
+                        d2 REAL, -- D2
+                        ppe REAL, -- PPE
+                        created_at TEXT,
+                        FOREIGN KEY(patient_id) REFERENCES patients(id)
+                      );''')
+
+def create_predictions_table(connection):
+    connection.execute('''CREATE TABLE IF NOT EXISTS predictions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        patient_id INTEGER,
+                        disease TEXT NOT NULL,
+                        model_version TEXT,
+                        measurement_id INTEGER,
+                        prediction INTEGER,
+                        risk_score REAL,
+                        risk_category TEXT,
+                        created_at TEXT,
+                        FOREIGN KEY(patient_id) REFERENCES patients(id)
+                      );''')
+
+MEASUREMENT_TABLES = ['diabetes_data', 'heart_disease_data', 'parkinsons_data_1']
+
+def table_columns(connection, table):
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+
+def _add_heart_disease_created_at(connection):
+    columns = table_columns(connection, 'heart_disease_data')
+    if columns and 'created_at' not in columns:
+        connection.execute("ALTER TABLE heart_disease_data ADD COLUMN created_at TEXT")
+
+def _add_measurement_indexes(connection):
+    for table in MEASUREMENT_TABLES:
+        if table_columns(connection, table):
+            connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_patient_created ON {table} (patient_id, created_at)")
+
+def _add_predictions_table(connection):
+    create_predictions_table(connection)
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_predictions_patient_disease ON predictions (patient_id, disease)")
+
+def _add_prediction_store_key(connection):
+    if 'suggestion' not in table_columns(connection, 'predictions'):
+        connection.execute("ALTER TABLE predictions ADD COLUMN suggestion TEXT")
+    # keep the newest row for each key before making it unique
+    connection.execute('''DELETE FROM predictions WHERE id NOT IN (
+                            SELECT MAX(id) FROM predictions GROUP BY patient_id, disease, model_version, measurement_id)''')
+    connection.execute("DROP INDEX IF EXISTS idx_predictions_patient_disease")
+    connection.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_key
+                          ON predictions (patient_id, disease, model_version, measurement_id)''')
+
+def _add_prediction_jobs_table(connection):
+    # queue for the background prediction workers (jobs.py)
+    connection.execute('''CREATE TABLE IF NOT EXISTS prediction_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        patient_id INTEGER,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        result TEXT,
+                        error TEXT,
+                        worker TEXT,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        created_at TEXT,
+                        started_at TEXT,
+                        finished_at TEXT
+                      );''')
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_prediction_jobs_status ON prediction_jobs (status, id)")
+
+# Applied in order; PRAGMA user_version records the last one that ran
+MIGRATIONS = [
+    (1, _add_heart_disease_created_at),
+    (2, _add_measurement_indexes),
+    (3, _add_predictions_table),
+    (4, _add_prediction_store_key),
+    (5, _add_prediction_jobs_table),
+]
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(connection):
+    if schema_version(connection) >= MIGRATIONS[-1][0]:
+        return schema_version(connection)
+    # base tables first so a brand-new database file ends up with the full schema
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        create_tables(connection)
+        connection.commit()
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    for version, step in MIGRATIONS:
+        # IMMEDIATE takes the write lock up front, so two processes can't both apply the same step
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if version > schema_version(connection):
+                step(connection)
+                connection.execute(f"PRAGMA user_version = {version}")
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+    return schema_version(connection)
+
+def pending_migrations(connection):
+    current = schema_version(connection)
+    return [version for version, _ in MIGRATIONS if version > current]
+
+def inspect(connection, tables=None, show_patients=False):
+    if not tables:
+        tables = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    print(f"schema version: {schema_version(connection)} (latest {MIGRATIONS[-1][0]})")
+    for table in tables:
+        count = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"\n{table} ({count} rows)")
+        for column in connection.execute(f"PRAGMA table_info({table})"):
+            print(f"  {column[1]} {column[2]}")
+        for index in connection.execute(f"PRAGMA index_list({table})"):
+            columns = [row[2] for row in connection.execute(f"PRAGMA index_info({index[1]})")]
+            print(f"  index {index[1]} ({', '.join(columns)})")
+    if show_patients:
+        print()
+        for patient in connection.execute("SELECT * FROM patients"):
+            print(patient)
+
+def main():
+    parser = argparse.ArgumentParser(description='Schema migrations and inspection for the health database.')
+    parser.add_argument('--db', help=f'Database file (default: {create_db.DB_PATH})')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('migrate', help='Apply pending migrations')
+    commands.add_parser('status', help='Show the schema version and pending migrations')
+    inspect_parser = commands.add_parser('inspect', help='Show columns, indexes and row counts')
+    inspect_parser.add_argument('tables', nargs='*')
+    inspect_parser.add_argument('--patients', action='store_true', help='Also print every patient row')
+    args = parser.parse_args()
+
+    if args.db:
+        create_db.DB_PATH = args.db
+    connection = create_db.create_connection()
+    try:
+        if args.command == 'migrate':
+            before = schema_version(connection)
+            after = migrate(connection)
+            print(f"schema version {before} -> {after}")
+        elif args.command == 'status':
+            print(f"schema version: {schema_version(connection)}")
+            print(f"pending: {pending_migrations(connection) or 'none'}")
+        else:
+            inspect(connection, args.tables, args.patients)
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    main()
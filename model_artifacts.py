@@ -0,0 +1,36 @@
+import pickle
+import platform
+from datetime import datetime
+
+# A model artifact is a pickled dict holding a fitted sklearn Pipeline (preprocessing + estimator),
+# the feature order it expects and some metadata. Older .sav files hold a bare estimator; both load here.
+ARTIFACT_FORMAT = 1
+
+
+def build_artifact(pipeline, feature_order, **metadata):
+    # sklearn is only needed when training, not when unpickling for inference
+    import sklearn
+
+    metadata.setdefault('trained_at', datetime.now().isoformat())
+    metadata.setdefault('sklearn_version', sklearn.__version__)
+    metadata.setdefault('python_version', platform.python_version())
+    return {
+        'format': ARTIFACT_FORMAT,
+        'pipeline': pipeline,
+        'feature_order': list(feature_order),
+        'metadata': metadata,
+    }
+
+
+def save_artifact(path, pipeline, feature_order, **metadata):
+    artifact = build_artifact(pipeline, feature_order, **metadata)
+    with open(path, 'wb') as file:
+        pickle.dump(artifact, file)
+    return artifact
+
+
+def unwrap_artifact(obj):
+    # -> (model, feature_order or None, metadata)
+    if isinstance(obj, dict) and 'pipeline' in obj:
+        return obj['pipeline'], obj.get('feature_order'), obj.get('metadata', {})
+    return obj, None, {}
@@ -0,0 +1,204 @@
+import os
+import pickle
+import hashlib
+import io
+import threading
+import time
+import tracemalloc
+from model_artifacts import unwrap_artifact
+
+# getting the working directory of the registry (same folder as app.py)
+working_dir = os.path.dirname(os.path.abspath(__file__))
+
+# disease -> saved model file
+MODEL_FILES = {
+    'diabetes': 'svc_diabetes.sav',
+    'heart_disease': 'logistic_model_updated.sav',
+    'parkinsons': 'rf_model_updated.sav',
+}
+
+# Serve compiled/<model>.npz (see compiled_models.py) instead of unpickling the sklearn model,
+# as long as it was compiled from the current .sav file
+USE_COMPILED = os.environ.get('HPX_COMPILED_MODELS', '0') == '1'
+# Measure each model's allocations with tracemalloc. Off by default: tracing slows everything it
+# covers, including the first unpickle's sklearn import, about 5x. Without it memory_bytes is the pickled size.
+TRACE_MEMORY = os.environ.get('HPX_TRACE_MODEL_MEMORY', '0') == '1'
+
+
+class LoadedModel:
+    def __init__(self, disease, path, model, version, mtime, load_seconds, memory_bytes, import_seconds=0.0,
+                 feature_order=None, metadata=None):
+        self.disease = disease
+        self.path = path
+        self.model = model
+        self.feature_order = feature_order
+        self.metadata = metadata or {}
+        self.version = version
+        self.mtime = mtime
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.import_seconds = import_seconds
+        self.loaded_at = time.time()
+
+    def info(self):
+        return {
+            'disease': self.disease,
+            'path': self.path,
+            'version': self.version,
+            'mtime': self.mtime,
+            'load_seconds': self.load_seconds,
+            'memory_bytes': self.memory_bytes,
+            'import_seconds': self.import_seconds,
+            'feature_order': self.feature_order,
+            'metadata': self.metadata,
+            'loaded_at': self.loaded_at,
+        }
+
+
+class _MeteredUnpickler(pickle.Unpickler):
+    # Keeps the one-off cost of importing sklearn out of the per-model numbers
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.import_seconds = 0.0
+        self.import_bytes = 0
+
+    def find_class(self, module, name):
+        start = time.perf_counter()
+        before = tracemalloc.get_traced_memory()[0]
+        cls = super().find_class(module, name)
+        self.import_bytes += tracemalloc.get_traced_memory()[0] - before
+        self.import_seconds += time.perf_counter() - start
+        return cls
+
+
+def _load_compiled(disease, path, version, mtime):
+    from compiled_models import compiled_path, load_compiled
+
+    compiled_file = compiled_path(path)
+    if not os.path.exists(compiled_file):
+        return None
+    start = time.perf_counter()
+    model, source_version, feature_order = load_compiled(compiled_file)
+    if source_version != version:
+        # stale: the .sav changed after compiling
+        return None
+    return LoadedModel(disease, path, model, version, mtime, time.perf_counter() - start, os.path.getsize(compiled_file),
+                       feature_order=feature_order, metadata={'compiled_from': compiled_file})
+
+
+def _load_model_file(disease, path, use_compiled=False):
+    with open(path, 'rb') as file:
+        raw = file.read()
+    mtime = os.path.getmtime(path)
+    version = hashlib.sha256(raw).hexdigest()[:12]
+    if use_compiled:
+        entry = _load_compiled(disease, path, version, mtime)
+        if entry is not None:
+            return entry
+
+    # Only start tracing if asked to and nobody else is already tracing
+    start_tracing = TRACE_MEMORY and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    unpickler = _MeteredUnpickler(io.BytesIO(raw))
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    model = unpickler.load()
+    load_seconds = time.perf_counter() - start - unpickler.import_seconds
+    if tracemalloc.is_tracing():
+        memory_bytes = tracemalloc.get_traced_memory()[0] - before - unpickler.import_bytes
+    else:
+        memory_bytes = len(raw)
+    if start_tracing:
+        tracemalloc.stop()
+
+    model, feature_order, metadata = unwrap_artifact(model)
+    return LoadedModel(disease, path, model, version, mtime, load_seconds, memory_bytes, unpickler.import_seconds,
+                       feature_order, metadata)
+
+
+class ModelRegistry:
+    # Loads each model once per process and reloads it when the .sav file changes on disk.
+
+    def __init__(self, model_files=None, base_dir=working_dir, check_interval=1.0, use_compiled=USE_COMPILED):
+        self.model_files = dict(model_files or MODEL_FILES)
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self.use_compiled = use_compiled
+        self._entries = {}
+        self._last_checked = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, disease):
+        if disease not in self.model_files:
+            raise KeyError(f"Unknown disease: {disease}")
+        return os.path.join(self.base_dir, self.model_files[disease])
+
+    def _file_changed(self, entry):
+        try:
+            return os.path.getmtime(entry.path) != entry.mtime
+        except OSError:
+            # Keep serving the model we have if the file is briefly missing mid-deploy
+            return False
+
+    def _is_stale(self, disease, entry):
+        now = time.monotonic()
+        if now - self._last_checked.get(disease, 0) < self.check_interval:
+            return False
+        self._last_checked[disease] = now
+        return self._file_changed(entry)
+
+    def get_entry(self, disease, version=None):
+        entry = self._entries.get(disease)
+        if entry is None or self._is_stale(disease, entry):
+            with self._lock:
+                entry = self._entries.get(disease)
+                if entry is None or self._file_changed(entry):
+                    entry = _load_model_file(disease, self.path_for(disease), self.use_compiled)
+                    self._entries[disease] = entry
+                    self._last_checked[disease] = time.monotonic()
+        if version is not None and entry.version != version:
+            raise KeyError(f"{disease} model version {version} is not loaded (current: {entry.version})")
+        return entry
+
+    def get(self, disease, version=None):
+        return self.get_entry(disease, version).model
+
+    def version(self, disease):
+        return self.get_entry(disease).version
+
+    def reload(self, disease=None):
+        diseases = [disease] if disease else list(self.model_files)
+        with self._lock:
+            for name in diseases:
+                self._entries[name] = _load_model_file(name, self.path_for(name), self.use_compiled)
+                self._last_checked[name] = time.monotonic()
+
+    def load_all(self):
+        for disease in self.model_files:
+            self.get_entry(disease)
+        return self.stats()
+
+    def stats(self):
+        return {disease: entry.info() for disease, entry in self._entries.items()}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    # One registry per process, shared by every Streamlit session
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+if __name__ == '__main__':
+    for disease, info in get_registry().load_all().items():
+        print(f"{disease}: {os.path.basename(info['path'])} v{info['version']} "
+              f"loaded in {info['load_seconds'] * 1000:.1f} ms, {info['memory_bytes'] / 1024:.1f} KiB")
@@ -0,0 +1,84 @@
+from typing import NamedTuple
+from create_db import PatientSnapshot, get_patient_feature_snapshot, insert_predictions, retrieve_stored_predictions
+from metrics import PREDICTION_SECONDS, timed
+from model_registry import get_registry
+from scoring import Score, VERDICTS, score_one
+
+# disease -> name used in the suggestion prompt
+SUGGESTION_NAMES = {'diabetes': 'Diabetes', 'heart_disease': 'Heart Disease', 'parkinsons': 'Parkinsons'}
+
+
+class PatientPrediction(NamedTuple):
+    snapshot: PatientSnapshot
+    scores: dict  # disease -> Score
+    suggestions: dict  # disease -> str
+    from_store: dict  # disease -> True if served from the predictions table
+
+    @property
+    def missing(self):
+        return self.snapshot.missing()
+
+
+def _stored_score(disease, row):
+    prediction = int(row['prediction'])
+    positive, negative = VERDICTS[disease]
+    return Score(prediction, float(row['risk_score']), row['risk_category'], positive if prediction == 1 else negative)
+
+
+@timed(PREDICTION_SECONDS)
+def predict_patient(patient_id, generator=None, registry=None, with_suggestions=True, use_store=True):
+    # Scores, suggestions and persistence for one patient. Results are stored per
+    # (patient, disease, model version, measurement row): asking again serves the stored row until a
+    # newer measurement is inserted or the model file changes. Returns None for an unknown patient.
+    snapshot = get_patient_feature_snapshot(patient_id)
+    if snapshot is None:
+        return None
+    if snapshot.missing():
+        return PatientPrediction(snapshot, {}, {}, {})
+
+    registry = registry or get_registry()
+    entries = {disease: registry.get_entry(disease) for disease in SUGGESTION_NAMES}
+    keys = {disease: (entry.version, snapshot.measurement(disease)['id']) for disease, entry in entries.items()}
+    stored = retrieve_stored_predictions(snapshot.patient['id'], keys) if use_store else {}
+
+    scores, suggestions, from_store = {}, {}, {}
+    for disease, entry in entries.items():
+        row = stored.get(disease)
+        if row is not None:
+            scores[disease] = _stored_score(disease, row)
+            from_store[disease] = True
+            if row['suggestion'] is not None:
+                suggestions[disease] = row['suggestion']
+        else:
+            scores[disease] = score_one(entry.model, snapshot.features(disease), disease)
+            from_store[disease] = False
+
+    pending = [disease for disease in SUGGESTION_NAMES if disease not in suggestions] if with_suggestions else []
+    if pending:
+        # imported lazily so scoring-only callers never load the text model
+        from health_suggestions import get_ai_health_suggestions_batch
+        generated = get_ai_health_suggestions_batch(
+            [(scores[disease].prediction, scores[disease].risk_category, SUGGESTION_NAMES[disease]) for disease in pending], generator)
+        suggestions.update(zip(pending, generated))
+
+    changed = [disease for disease in SUGGESTION_NAMES if not from_store[disease] or disease in pending]
+    if changed:
+        insert_predictions([(snapshot.patient['id'], disease, keys[disease][0], keys[disease][1],
+                             scores[disease].prediction, scores[disease].risk_score, scores[disease].risk_category,
+                             suggestions.get(disease))
+                            for disease in changed])
+
+    return PatientPrediction(snapshot, scores, suggestions, from_store)
+
+
+def prediction_result(prediction):
+    # PatientPrediction -> JSON-friendly dict (job results, HTTP API)
+    if prediction is None:
+        return {'patient': None}
+    return {
+        'patient': {key: prediction.snapshot.patient[key] for key in ('id', 'name', 'age', 'gender')},
+        'missing': prediction.missing,
+        'scores': {disease: score._asdict() for disease, score in prediction.scores.items()},
+        'suggestions': prediction.suggestions,
+        'from_store': prediction.from_store,
+    }
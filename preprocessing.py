@@ -0,0 +1,33 @@
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+
+
+class ZeroAsMissingImputer(TransformerMixin, BaseEstimator):
+    # Median imputation where, for the columns in zero_as_missing (indices), a 0 also counts as missing
+    # (e.g. a glucose or insulin reading of 0 means "not measured"). All medians come from one
+    # vectorized pass in fit and are pickled with the Pipeline, so serving imputes exactly like training.
+
+    def __init__(self, zero_as_missing=()):
+        self.zero_as_missing = zero_as_missing
+
+    def _missing(self, X):
+        missing = np.isnan(X)
+        columns = list(self.zero_as_missing)
+        if columns:
+            missing[:, columns] |= X[:, columns] == 0
+        return missing
+
+    def fit(self, X, y=None):
+        X = np.asarray(X, dtype=float)
+        missing = self._missing(X)
+        counts = (~missing).sum(axis=0)
+        # np.nanmedian warns on all-missing columns; those fall back to 0
+        medians = np.nanmedian(np.where(missing, np.nan, X)[:, counts > 0], axis=0)
+        self.statistics_ = np.zeros(X.shape[1])
+        self.statistics_[counts > 0] = medians
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=float)
+        return np.where(self._missing(X), self.statistics_, X)
@@ -0,0 +1,61 @@
+from io import BytesIO
+from fpdf import FPDF
+from metrics import PDF_SECONDS, timed
+
+
+@timed(PDF_SECONDS)
+def create_pdf(patient_data):
+    # Initialize FPDF object
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Set font and title
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt="Comprehensive Medical Report", ln=True, align="C")
+    pdf.ln(10)  # Line break
+    
+    # Add patient details from the dictionary
+    pdf.cell(200, 10, txt=f"Name: {patient_data['Name']}", ln=True)
+    pdf.cell(200, 10, txt=f"Age: {patient_data['Age']}", ln=True)
+    pdf.cell(200, 10, txt=f"Sex: {patient_data['Sex']}", ln=True)
+    pdf.ln(5)  # Line break for better formatting
+    
+    # Add health assessment details
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(200, 10, txt="Diabetes Assessment:", ln=True)
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"  Verdict: {patient_data['Diabetes Verdict']}", ln=True)
+    pdf.cell(200, 10, txt=f"  Risk: {patient_data['Risk of Diabetes']}", ln=True)
+    #pdf.cell(200, 10, txt=f"  Treatment Suggestion: {patient_data['Diabetes Treatment Suggestion']}", ln=True)
+    pdf.multi_cell(0, 10, txt=f"  Treatment Suggestion: {patient_data['Diabetes Treatment Suggestion']}")
+    pdf.ln(5)  # Line break
+    
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(200, 10, txt="Heart Disease Assessment:", ln=True)
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"  Verdict: {patient_data['Heart Disease Verdict']}", ln=True)
+    pdf.cell(200, 10, txt=f"  Risk: {patient_data['Risk of Heart Disease']}", ln=True)
+    #pdf.cell(200, 10, txt=f"  Treatment Suggestion: {patient_data['Heart Disease Treatment Suggestion']}", ln=True)
+    pdf.multi_cell(0, 10, txt=f"  Treatment Suggestion: {patient_data['Heart Disease Treatment Suggestion']}")
+    pdf.ln(5)  # Line break
+    
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(200, 10, txt="Parkinson's Disease Assessment:", ln=True)
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"  Verdict: {patient_data['Parkinsons Verdict']}", ln=True)
+    pdf.cell(200, 10, txt=f"  Risk: {patient_data['Risk of Parkinsons']}", ln=True)
+    #pdf.cell(200, 10, txt=f"  Treatment Suggestion: {patient_data['Parkinsons Treatment Suggestion']}", ln=True)
+    pdf.multi_cell(0, 10, txt=f"  Treatment Suggestion: {patient_data['Parkinsons Treatment Suggestion']}")
+    pdf.ln(10)
+    
+    pdf.set_font("Arial", 'I', 10)
+    pdf.multi_cell(0, 10, txt="This report is based on preliminary health assessments and may require further clinical evaluation.")
+    
+    pdf_buffer = BytesIO()
+    
+    pdf_output = pdf.output(dest='S').encode('latin1')
+    pdf_buffer.write(pdf_output)
+    
+    pdf_buffer.seek(0)
+
+    return pdf_buffer
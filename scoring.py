@@ -0,0 +1,41 @@
+from typing import NamedTuple
+import numpy as np
+from metrics import SCORE_SECONDS, span
+
+# (positive verdict, negative verdict) shown on the prediction page and in the report
+VERDICTS = {
+    'diabetes': ('The patient is diabetic', 'The patient is not diabetic'),
+    'heart_disease': ('The patient is having heart disease and is at risk of heart failure', 'The patient does not have any heart disease'),
+    'parkinsons': ("The patient has Parkinson's disease", "The patient doesn't have Parkinson's disease"),
+}
+
+
+class Score(NamedTuple):
+    prediction: int
+    risk_score: float
+    risk_category: str
+    verdict: str
+
+
+def risk_category(risk_score):
+    return 'Low Risk' if risk_score < 0.3 else 'Medium Risk' if 0.3 <= risk_score < 0.7 else 'High Risk'
+
+
+def score_batch(model, X, disease):
+    # One predict_proba pass per batch. The label is derived from the same probabilities, so it can't
+    # disagree with the risk score the way SVC.predict (decision function) and predict_proba (Platt) can.
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    with span(SCORE_SECONDS, disease=disease):
+        probabilities = model.predict_proba(X)
+    classes = list(model.classes_)
+    labels = np.asarray(model.classes_)[probabilities.argmax(axis=1)]
+    risk_scores = probabilities[:, classes.index(1)]
+    positive, negative = VERDICTS[disease]
+    return [Score(int(label), float(risk_score), risk_category(risk_score), positive if label == 1 else negative)
+            for label, risk_score in zip(labels, risk_scores)]
+
+
+def score_one(model, x, disease):
+    return score_batch(model, [x], disease)[0]
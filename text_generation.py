@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from collections import deque
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer
+import metrics
+
+# Knobs for CPU nodes; unset means "let torch decide"
+MODEL_NAME = os.environ.get('HPX_TEXT_MODEL', 'gpt2')
+DEVICE = os.environ.get('HPX_TEXT_DEVICE')  # 'cpu', 'cuda', 'cuda:1', ...
+NUM_THREADS = os.environ.get('HPX_TORCH_THREADS')  # intra-op threads
+NUM_INTEROP_THREADS = os.environ.get('HPX_TORCH_INTEROP_THREADS')
+# 'torch' (fp32), 'int8' (dynamically quantized linear layers, CPU) or 'onnx' (ONNX Runtime, CPU; needs optimum[onnxruntime])
+BACKEND = os.environ.get('HPX_TEXT_BACKEND', 'torch')
+# exported ONNX graphs are kept here and reused on the next start
+ONNX_CACHE_DIR = os.environ.get('HPX_ONNX_CACHE', 'onnx_models')
+BACKENDS = ('torch', 'int8', 'onnx')
+
+
+def pick_device(device=None):
+    if device:
+        return torch.device(device)
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+def configure_threads(num_threads=None, num_interop_threads=None):
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(int(num_interop_threads))
+        except RuntimeError:
+            # torch only allows this before the first parallel op in the process
+            pass
+
+
+def _conv1d_to_linear(module):
+    # GPT-2 keeps its projections in transformers' Conv1D (weight stored as in x out), which
+    # quantize_dynamic doesn't know about; the equivalent nn.Linear holds the transposed weight
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = torch.nn.Parameter(child.bias.detach().clone())
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+    return module
+
+
+def _onnx_model(model_name):
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError as e:
+        raise ImportError("the 'onnx' text backend needs optimum[onnxruntime] installed") from e
+
+    path = os.path.join(ONNX_CACHE_DIR, model_name.strip('/').replace('/', '--'))
+    if os.path.isdir(path):
+        return ORTModelForCausalLM.from_pretrained(path)
+    model = ORTModelForCausalLM.from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    return model
+
+
+def load_causal_lm(model_name, backend=BACKEND, device=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown text backend '{backend}'; expected one of {', '.join(BACKENDS)}")
+    if backend == 'onnx':
+        return _onnx_model(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    model.eval()
+    if backend == 'int8':
+        # weights stored as int8, activations quantized on the fly; CPU only
+        return torch.ao.quantization.quantize_dynamic(_conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return model.to(device)
+
+
+class TextGenerator:
+    # Holds one tokenizer and one model in memory. Calling it mirrors the
+    # transformers text-generation pipeline: it returns [{'generated_text': ...}].
+
+    def __init__(self, model_name=MODEL_NAME, device=DEVICE, max_length=50,
+                 num_threads=NUM_THREADS, num_interop_threads=NUM_INTEROP_THREADS, backend=BACKEND):
+        configure_threads(num_threads, num_interop_threads)
+        self.model_name = model_name
+        self.backend = backend
+        # the int8 and ONNX backends only run on CPU
+        self.device = pick_device(device) if backend == 'torch' else torch.device('cpu')
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        # decoder-only models must be padded on the left for batched generation
+        self.tokenizer.padding_side = 'left'
+        self.model = load_causal_lm(model_name, backend, self.device)
+        self._lock = threading.Lock()
+        # time-to-first-token of recent streamed generations, in seconds
+        self.ttft_seconds = deque(maxlen=1000)
+
+    def _generation_kwargs(self, max_length, num_return_sequences, temperature, do_sample, kwargs):
+        options = {
+            'max_length': max_length or self.max_length,
+            'num_return_sequences': num_return_sequences,
+            'do_sample': do_sample,
+            'pad_token_id': self.tokenizer.pad_token_id,
+        }
+        if do_sample and temperature is not None:
+            options['temperature'] = temperature
+        options.update(kwargs)
+        return options
+
+    def generate_batch(self, prompts, max_length=None, num_return_sequences=1, temperature=None, do_sample=True, **kwargs):
+        # Decodes every prompt in one left-padded batch; returns one list of texts per prompt
+        inputs = self.tokenizer(list(prompts), return_tensors='pt', padding=True).to(self.device)
+        options = self._generation_kwargs(max_length, num_return_sequences, temperature, do_sample, kwargs)
+        max_length = options.pop('max_length')
+        budgets = None
+        if max_length is not None and 'max_new_tokens' not in options:
+            # max_length counts each row's own prompt: generate up to the shortest prompt's budget, then cut
+            # every row back to the tokens it would have got on its own
+            budgets = [max(max_length - length, 0) for length in inputs['attention_mask'].sum(dim=1).tolist()]
+            options['max_new_tokens'] = max(max(budgets), 1)
+        # One model shared between sessions; generate() is not re-entrant safe on every backend
+        with self._lock, torch.inference_mode():
+            output_ids = self.model.generate(**inputs, **options)
+        if budgets is not None:
+            width = inputs['input_ids'].shape[1]
+            output_ids = [row[:width + budgets[i // num_return_sequences]] for i, row in enumerate(output_ids)]
+        texts = self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+        return [texts[i:i + num_return_sequences] for i in range(0, len(texts), num_return_sequences)]
+
+    def __call__(self, prompt, max_length=None, num_return_sequences=1, temperature=None, do_sample=True, **kwargs):
+        texts = self.generate_batch([prompt], max_length, num_return_sequences, temperature, do_sample, **kwargs)[0]
+        return [{'generated_text': text} for text in texts]
+
+    def stream(self, prompt, max_length=None, temperature=None, do_sample=True, **kwargs):
+        # Yields the continuation (without the prompt) piece by piece as tokens are decoded
+        start = time.perf_counter()
+        inputs = self.tokenizer(prompt, return_tensors='pt').to(self.device)
+        options = self._generation_kwargs(max_length, 1, temperature, do_sample, kwargs)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def run():
+            try:
+                with self._lock, torch.inference_mode():
+                    self.model.generate(**inputs, **options, streamer=streamer)
+            except Exception as e:
+                errors.append(e)
+                # unblock the consumer, otherwise it waits on the streamer forever
+                streamer.end()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        first_token = True
+        for text in streamer:
+            if not text:
+                continue
+            if first_token:
+                ttft = time.perf_counter() - start
+                self.ttft_seconds.append(ttft)
+                if metrics.ENABLED:
+                    metrics.observe(metrics.TTFT_SECONDS, ttft, backend=self.backend)
+                first_token = False
+            yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def ttft_stats(self):
+        samples = sorted(self.ttft_seconds)
+        if not samples:
+            return {'count': 0}
+        return {
+            'count': len(samples),
+            'last': self.ttft_seconds[-1],
+            'p50': samples[len(samples) // 2],
+            'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_text_generator():
+    # Built once per process; Streamlit reruns reuse the same instance
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = TextGenerator()
+    return _generator
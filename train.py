@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# One entry point for (re)training the disease models: `python train.py [diseases] [--search ...]`.
+# Each disease trains in its own process. Every run writes a versioned artifact under models/<disease>/
+# and records it in models/manifest.json; a disease whose dataset and training config hash the same as
+# the manifest's last run is skipped, so a refresh only redoes what changed.
+MODELS_DIR = 'models'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_hash(disease, method, n_iter):
+    # everything besides the data that decides what gets trained
+    import sklearn
+    import pandas as pd
+    from training import TRAINING_SPECS, build_pipeline, dataset_path
+
+    spec = TRAINING_SPECS[disease]
+    columns = pd.read_csv(dataset_path(disease), nrows=0).drop(columns=spec['drop'] + [spec['target']]).columns
+    config = {
+        'pipeline': repr(sorted(build_pipeline(disease, columns).get_params(deep=True).items(), key=lambda item: item[0])),
+        'search_space': spec['search_space'],
+        'zero_as_missing': spec['zero_as_missing'],
+        'drop': spec['drop'],
+        'target': spec['target'],
+        'search': method,
+        'n_iter': n_iter if method == 'random' else None,
+        'sklearn_version': sklearn.__version__,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def load_manifest(path):
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)
+    return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def train_one(disease, method, n_jobs, n_iter, models_dir, data_hash, config_digest):
+    # runs in a worker process; returns the manifest record for this run
+    from training import train_disease
+
+    version = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{config_digest[:6]}{data_hash[:6]}"
+    os.makedirs(os.path.join(models_dir, disease), exist_ok=True)
+    path = os.path.join(models_dir, disease, f"{version}.sav")
+    start = time.perf_counter()
+    artifact = train_disease(disease, method=method, n_jobs=n_jobs, n_iter=n_iter, output=path)
+    metadata = artifact['metadata']
+    return {
+        'version': version,
+        'artifact': path,
+        'artifact_sha256': file_hash(path),
+        'data_hash': data_hash,
+        'config_hash': config_digest,
+        'search': method,
+        'metrics': {'accuracy': metadata['accuracy'], 'cv_accuracy': metadata['cv_accuracy']},
+        'best_params': metadata['best_params'],
+        'feature_order': artifact['feature_order'],
+        'n_train': metadata['n_train'],
+        'trained_at': metadata['trained_at'],
+        'training_seconds': time.perf_counter() - start,
+        'sklearn_version': metadata['sklearn_version'],
+    }
+
+
+def publish(disease, record):
+    # copy over the file the model registry serves; it notices the new mtime and reloads
+    from training import DATA_DIR, TRAINING_SPECS
+
+    target = os.path.join(DATA_DIR, TRAINING_SPECS[disease]['artifact'])
+    tmp_path = target + '.tmp'
+    shutil.copyfile(record['artifact'], tmp_path)
+    os.replace(tmp_path, target)
+    return target
+
+
+def train(diseases=None, method='grid', workers=None, n_iter=20, models_dir=MODELS_DIR, force=False, publish_models=True,
+          progress=print):
+    from training import TRAINING_SPECS, dataset_path
+
+    diseases = diseases or list(TRAINING_SPECS)
+    manifest_path = os.path.join(models_dir, 'manifest.json')
+    os.makedirs(models_dir, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+
+    pending = {}
+    for disease in diseases:
+        data_hash = file_hash(dataset_path(disease))
+        digest = config_hash(disease, method, n_iter)
+        current = manifest.get(disease, {}).get('current')
+        if not force and current and current['data_hash'] == data_hash and current['config_hash'] == digest \
+                and os.path.exists(current['artifact']):
+            progress(f"{disease}: up to date ({current['version']}), skipped")
+            continue
+        pending[disease] = (data_hash, digest)
+
+    results = {}
+    if pending:
+        workers = workers or len(pending)
+        # split the cores between the concurrent searches
+        n_jobs = max(1, (os.cpu_count() or 1) // min(workers, len(pending)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {disease: pool.submit(train_one, disease, method, n_jobs, n_iter, models_dir, data_hash, digest)
+                       for disease, (data_hash, digest) in pending.items()}
+            for disease, future in futures.items():
+                record = future.result()
+                if publish_models:
+                    record['published_to'] = publish(disease, record)
+                entry = manifest.setdefault(disease, {'history': []})
+                entry['current'] = record
+                entry['history'].append({key: record[key] for key in ('version', 'artifact', 'data_hash', 'config_hash', 'metrics', 'trained_at')})
+                results[disease] = record
+                # saved after each disease, so a crash later on keeps the finished ones
+                save_manifest(manifest_path, manifest)
+                progress(f"{disease}: trained {record['version']} in {record['training_seconds']:.1f}s, "
+                         f"accuracy {record['metrics']['accuracy']:.3f}")
+    return results
+
+
+def main():
+    from training import SEARCH_METHODS, TRAINING_SPECS
+
+    parser = argparse.ArgumentParser(description='Train the disease models and record them in a manifest.')
+    parser.add_argument('diseases', nargs='*', help=f"Any of {', '.join(TRAINING_SPECS)} (default: all)")
+    parser.add_argument('--search', choices=[*SEARCH_METHODS, 'none'], default='grid', help='Hyperparameter search (default: grid)')
+    parser.add_argument('--n-iter', type=int, default=20, help='Candidates tried by --search random')
+    parser.add_argument('--workers', type=int, help='Diseases trained at once (default: all requested)')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--force', action='store_true', help='Retrain even if data and config are unchanged')
+    parser.add_argument('--no-publish', action='store_true', help="Don't replace the .sav files the app serves")
+    args = parser.parse_args()
+    unknown = [disease for disease in args.diseases if disease not in TRAINING_SPECS]
+    if unknown:
+        parser.error(f"unknown disease(s): {', '.join(unknown)}")
+
+    train(args.diseases or None, None if args.search == 'none' else args.search, args.workers, args.n_iter, args.models_dir,
+          args.force, not args.no_publish)
+
+
+if __name__ == '__main__':
+    main()